@@ -0,0 +1,45 @@
+import os
+import sys
+
+from utils.seededenv import SeededHeartsEnv
+from strategy.completeplay import CompletePlayStrategy
+from strategy.mctsplay import MCTSPlayStrategy
+
+
+# how MCTSPlayStrategy scales with root parallel (processes) and tree parallel
+# (threads) search from 1 to N workers: iterations per second at a fixed time
+# per move, and the share of the penalty points the mcts player took in seeded
+# games against three CompletePlayStrategy players (lower is stronger, 0.25 is even).
+# usage: python bench_parallelmcts.py [max_workers] [games] [seconds_per_move]
+max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count()
+number_of_games = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+time_limit = float(sys.argv[3]) if len(sys.argv) > 3 else 0.05
+
+
+def play(parallel, workers):
+    mcts_strategy = MCTSPlayStrategy(
+        budget=10 ** 9, my_player_id=0, time_limit=time_limit, seed=0, parallel=parallel, workers=workers
+    )
+    share = 0.0
+    for seed in range(number_of_games):
+        env = SeededHeartsEnv(seed=seed)
+        env.add_player(mcts_strategy)
+        for _ in range(3):
+            env.add_player(CompletePlayStrategy())
+        env.start()
+        done = False
+        while not done:
+            action = env.move()
+            observation, reward, done, info = env.step(action)
+        share += observation['scores'][0] / max(1, sum(observation['scores']))
+    mcts_strategy.close()
+    return mcts_strategy.iterations_per_second(), share / number_of_games
+
+
+print("{} cpus, {} games per row, {}s per move".format(os.cpu_count(), number_of_games, time_limit))
+iterations_per_second, share = play(None, 1)
+print("{:>6} {:>7} {:>12.0f} it/s {:>6.3f} share".format('serial', 1, iterations_per_second, share))
+for parallel in ('root', 'tree'):
+    for workers in range(1, max_workers + 1):
+        iterations_per_second, share = play(parallel, workers)
+        print("{:>6} {:>7} {:>12.0f} it/s {:>6.3f} share".format(parallel, workers, iterations_per_second, share))
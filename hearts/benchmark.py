@@ -0,0 +1,266 @@
+import sys
+import copy
+import json
+import time
+import argparse
+import tracemalloc
+
+from utils.seededenv import SeededHeartsEnv
+from strategy.firstplay import FirstPlayStrategy
+from strategy.lowplay import LowPlayStrategy
+from strategy.completeplay import CompletePlayStrategy
+from strategy.lookaheadplay import LookAheadPlayStrategy
+from strategy.lookaheadplay import simulate
+from strategy.mctsplay import MCTSPlayStrategy
+from strategy.sampler import DealSampler
+from strategy.endgame import EndgameSolver
+from strategy.simulator import HeartsSimulator
+from strategy.cards import cards_to_mask
+from strategy.batchplay import BatchCompletePlayStrategy
+from utils.batchenv import BatchHeartsEnv
+
+
+# Benchmarks with fixed seeds on recorded positions. Seeded games of four
+# CompletePlayStrategy players are recorded once, every strategy then replays
+# the same games: it watches every play and is asked for a move at each turn
+# of seat 0, while the recorded card is what gets played. Timings run without
+# tracemalloc, peak memory is taken in a second pass with it.
+#
+#   python benchmark.py --save baseline.json
+#   python benchmark.py --compare baseline.json --threshold 0.1
+#
+# endgame.* solves the recorded positions with 3 or fewer cards left in hand.
+# batch.complete plays self-play games of BatchCompletePlayStrategy in
+# BatchHeartsEnv, 4096 games at a time.
+#
+# Metrics named *_per_second are better when higher, all others when lower.
+
+STRATEGIES = [
+    ('first', lambda seed: FirstPlayStrategy()),
+    ('low', lambda seed: LowPlayStrategy()),
+    ('complete', lambda seed: CompletePlayStrategy()),
+    ('lookahead', lambda seed: LookAheadPlayStrategy(rollouts=32, seed=seed)),
+    ('mcts', lambda seed: MCTSPlayStrategy(budget=300, my_player_id=0, seed=seed)),
+]
+
+
+def record_games(seeds):
+    # a game is a list of (observation, hands, action, next observation, info)
+    games = []
+    for seed in seeds:
+        env = SeededHeartsEnv(seed=seed, sort_hands=True)
+        for _ in range(4):
+            env.add_player(CompletePlayStrategy())
+        env.start()
+        steps = []
+        done = False
+        while not done:
+            hands = [cards_to_mask(player.get_hand_cards()) for player in env._players]
+            action = env.move()
+            # hand_cards is the player's own list, copy before step changes it
+            observation = copy.deepcopy(env._current_observation)
+            next_observation, reward, done, info = env.step(action)
+            steps.append((observation, hands, action, copy.deepcopy(next_observation), dict(info)))
+        games.append(steps)
+    return games
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100.0 * len(values)))]
+
+
+def replay(games, factory):
+    latencies = []
+    players = []
+    for game_index, steps in enumerate(games):
+        player = factory(game_index)
+        players.append(player)
+        for observation, hands, action, next_observation, info in steps:
+            if observation['current_player_id'] == 0:
+                start = time.perf_counter()
+                player.move(observation)
+                latencies.append(time.perf_counter() - start)
+            try:
+                player.watch(next_observation, info)
+            except NotImplementedError:
+                pass
+    return latencies, players
+
+
+def bench_moves(games, name, factory):
+    latencies, players = replay(games, factory)
+    result = {
+        'p50_us': 1e6 * percentile(latencies, 50),
+        'p99_us': 1e6 * percentile(latencies, 99),
+    }
+    if name == 'mcts':
+        iterations = sum(p._iterations for p in players)
+        elapsed = sum(p._elapsed for p in players)
+        result['iterations_per_second'] = iterations / elapsed
+    return result
+
+
+def simulator_rollouts(games, repeat):
+    simulator = HeartsSimulator()
+    count = 0
+    for steps in games:
+        for observation, hands, action, next_observation, info in steps:
+            for _ in range(repeat):
+                simulator.reset(observation, hands)
+                simulator.rollout()
+                count += 1
+    return count
+
+
+def lookahead_rollouts(games, repeat):
+    # what LookAheadPlayStrategy._simulate does: deal the hidden cards, roll out
+    simulator = HeartsSimulator()
+    sampler = DealSampler(0)
+    count = 0
+    for steps in games:
+        available_mask = (1 << 52) - 1
+        for observation, hands, action, next_observation, info in steps:
+            hand_mask = hands[observation['current_player_id']]
+            sampler.reset(available_mask & ~hand_mask)
+            count += len(simulate(simulator, sampler, action, observation, repeat))
+            available_mask &= ~cards_to_mask([action])
+            if info['is_new_round']:
+                available_mask = (1 << 52) - 1
+    return count
+
+
+def bench_rollouts(games, rollouts, repeat):
+    start = time.perf_counter()
+    count = rollouts(games, repeat)
+    return {'rollouts_per_second': count / (time.perf_counter() - start)}
+
+
+def solve_endgames(games, solver, cards=3):
+    # solve every recorded position from the second trick on with at most
+    # cards left in hand, return the solve times
+    latencies = []
+    simulator = HeartsSimulator()
+    for steps in games:
+        for observation, hands, action, next_observation, info in steps:
+            if observation['trick'] > 0 and len(observation['hand_cards']) <= cards:
+                simulator.reset(observation, hands)
+                start = time.perf_counter()
+                solver.solve(simulator, observation['current_player_id'])
+                latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_endgame(games, paranoid):
+    solver = EndgameSolver(paranoid=paranoid)
+    latencies = solve_endgames(games, solver)
+    return {
+        'p50_us': 1e6 * percentile(latencies, 50),
+        'p99_us': 1e6 * percentile(latencies, 99),
+        'nodes_per_second': solver.nodes_per_second(),
+    }
+
+
+def batch_moves(number_of_games, steps):
+    env = BatchHeartsEnv(number_of_games, seed=0, auto_reset=True)
+    strategy = BatchCompletePlayStrategy()
+    for _ in range(4):
+        env.add_player(strategy)
+    env.start()
+    observation = env.get_observation()
+    for _ in range(steps):
+        observation, rewards, done, info = env.step(env.move(observation))
+    return number_of_games * steps
+
+
+def bench_batch(repeat):
+    start = time.perf_counter()
+    count = batch_moves(4096, 52 * repeat)
+    return {'moves_per_second': count / (time.perf_counter() - start)}
+
+
+def peak_kb(run):
+    tracemalloc.start()
+    try:
+        run()
+        return tracemalloc.get_traced_memory()[1] / 1024.0
+    finally:
+        tracemalloc.stop()
+
+
+def run_benchmarks(seeds, repeat, names=None):
+    games = record_games(seeds)
+    results = {}
+    for name, factory in STRATEGIES:
+        if names and 'move.' + name not in names:
+            continue
+        result = bench_moves(games, name, factory)
+        # a single game is enough for the memory peak of one player
+        result['peak_kb'] = peak_kb(lambda: replay(games[:1], factory))
+        results['move.' + name] = result
+    for name, rollouts in (('simulator', simulator_rollouts), ('lookahead', lookahead_rollouts)):
+        if names and 'rollouts.' + name not in names:
+            continue
+        result = bench_rollouts(games, rollouts, repeat)
+        result['peak_kb'] = peak_kb(lambda: rollouts(games[:1], 1))
+        results['rollouts.' + name] = result
+    for name, paranoid in (('maxn', False), ('paranoid', True)):
+        if names and 'endgame.' + name not in names:
+            continue
+        result = bench_endgame(games, paranoid)
+        result['peak_kb'] = peak_kb(lambda: solve_endgames(games[:1], EndgameSolver(paranoid=paranoid)))
+        results['endgame.' + name] = result
+    if not names or 'batch.complete' in names:
+        result = bench_batch(repeat)
+        result['peak_kb'] = peak_kb(lambda: batch_moves(4096, 52))
+        results['batch.complete'] = result
+    return results
+
+
+def compare(baseline, results, threshold):
+    # (benchmark, metric, baseline, current, change) of every regression
+    regressions = []
+    for benchmark, metrics in sorted(results.items()):
+        for metric, value in sorted(metrics.items()):
+            if metric not in baseline.get(benchmark, {}):
+                continue
+            base = baseline[benchmark][metric]
+            if base == 0:
+                continue
+            change = (value - base) / base
+            worse = -change if metric.endswith('_per_second') else change
+            if worse > threshold:
+                regressions.append((benchmark, metric, base, value, change))
+    return regressions
+
+
+def show(results):
+    for benchmark, metrics in sorted(results.items()):
+        print("{:<20} {}".format(benchmark, '  '.join(
+            "{} {:.2f}".format(metric, value) for metric, value in sorted(metrics.items())
+        )))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='benchmark hearts strategies and simulators')
+    parser.add_argument('--games', type=int, default=3, help='number of recorded games, seeded 0..games-1')
+    parser.add_argument('--repeat', type=int, default=4, help='rollouts per recorded position')
+    parser.add_argument('--only', nargs='*', help='benchmark names, e.g. move.mcts rollouts.simulator')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative change that counts as a regression')
+    args = parser.parse_args()
+    results = run_benchmarks(range(args.games), args.repeat, args.only)
+    show(results)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.threshold)
+        for benchmark, metric, base, value, change in regressions:
+            print("REGRESSION {} {}: {:.2f} -> {:.2f} ({:+.0%})".format(benchmark, metric, base, value, change))
+        if regressions:
+            sys.exit(1)
+        print("no regressions beyond {:.0%}".format(args.threshold))
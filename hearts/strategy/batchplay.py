@@ -0,0 +1,94 @@
+import numpy
+
+from .cards import RANK_MASK
+from .cards import SUIT_MASKS
+from .cards import HEARTS_MASK
+from .cards import SPADES_QUEEN_BIT
+from .cards import CLUB_TWO_BIT
+from .cards import PENALTIES
+from .cards import ALL_CARDS_MASK
+
+
+# Rule based strategies for utils.batchenv.BatchHeartsEnv. move() gets the
+# observation of many games at once as numpy arrays, hands and trick cards as
+# uint64 bitmasks in the cards.py encoding, and returns the card index played
+# in every game. They pick the same card as their single game versions when
+# hands are kept in index order, like the simulator policy.
+U64_SUIT_MASKS = numpy.array(SUIT_MASKS, numpy.uint64)
+U64_SUIT_SHIFTS = numpy.array([13 * s for s in range(4)], numpy.uint64)
+U64_PENALTY_MASK = numpy.uint64(HEARTS_MASK | SPADES_QUEEN_BIT)
+U64_SAFE_MASK = numpy.uint64(ALL_CARDS_MASK & ~(HEARTS_MASK | SPADES_QUEEN_BIT))
+U64_CLUB_TWO_BIT = numpy.uint64(CLUB_TWO_BIT)
+U64_ONE = numpy.uint64(1)
+PENALTY_POINTS = numpy.array(PENALTIES, numpy.int64)
+
+# lowest and highest set bit of every 13 bit rank set, -1 for the empty set
+LOW_RANK = numpy.array([(r & -r).bit_length() - 1 for r in range(1 << 13)], numpy.int64)
+HIGH_RANK = numpy.array([r.bit_length() - 1 for r in range(1 << 13)], numpy.int64)
+# lowest suit in a 4 bit set of suits
+LOW_SUIT = numpy.array([(s & -s).bit_length() - 1 for s in range(16)], numpy.int64)
+
+_RANK_MASK = numpy.uint64(RANK_MASK)
+_SUIT_BITS = numpy.uint64(1 | 1 << 13 | 1 << 26 | 1 << 39)
+
+
+def ranks_of(masks):
+    # the ranks held in any suit
+    return (masks | (masks >> U64_SUIT_SHIFTS[1]) | (masks >> U64_SUIT_SHIFTS[2]) | (masks >> U64_SUIT_SHIFTS[3])) \
+        & _RANK_MASK
+
+
+def suit_ranks(masks, suits):
+    # the ranks held in the given suit of every mask
+    return (masks >> U64_SUIT_SHIFTS[suits]) & _RANK_MASK
+
+
+def _first_of_ranks(masks, ranks):
+    # the first card in index order with the given rank, see cards._first_of_rank
+    bits = (masks >> ranks.astype(numpy.uint64)) & _SUIT_BITS
+    suits = (bits | (bits >> 12) | (bits >> 24) | (bits >> 36)) & numpy.uint64(15)
+    return LOW_SUIT[suits] * 13 + ranks
+
+
+def min_cards(masks):
+    return _first_of_ranks(masks, LOW_RANK[ranks_of(masks)])
+
+
+def max_cards(masks):
+    return _first_of_ranks(masks, HIGH_RANK[ranks_of(masks)])
+
+
+class BatchFirstPlayStrategy(object):
+
+    def move(self, observation):
+        # the first valid card in hand, the lowest index for sorted hands
+        valid = observation['valid_hand_cards']
+        return numpy.log2((valid & (~valid + U64_ONE)).astype(numpy.float64)).astype(numpy.int64)
+
+
+class BatchLowPlayStrategy(object):
+
+    def move(self, observation):
+        return min_cards(observation['valid_hand_cards'])
+
+
+# CompletePlayStrategy: the last player of a trick with penalty points plays
+# its highest card below the best card of the lead suit, or its highest card
+# when it cannot stay below or does not have to, everybody else its lowest card
+class BatchCompletePlayStrategy(object):
+
+    def move(self, observation):
+        valid = observation['valid_hand_cards']
+        cards = min_cards(valid)
+        last = numpy.flatnonzero(observation['number_of_playing_cards'] == 3)
+        if len(last) == 0:
+            return cards
+        valid = valid[last]
+        playing_mask = observation['playing_mask'][last]
+        lead_suits = observation['playing_cards'][last, 0] // 13
+        competitor_ranks = HIGH_RANK[suit_ranks(playing_mask, lead_suits)]
+        safe_ranks = suit_ranks(valid, lead_suits) & ((U64_ONE << competitor_ranks.astype(numpy.uint64)) - U64_ONE)
+        safe = ((playing_mask & U64_PENALTY_MASK) != 0) & (safe_ranks != 0)
+        last_cards = numpy.where(safe, HIGH_RANK[safe_ranks] + 13 * lead_suits, max_cards(valid))
+        cards[last] = last_cards
+        return cards
@@ -0,0 +1,61 @@
+from .cards import ALL_CARDS_MASK
+from .cards import CARD_TO_INDEX
+from .cards import SUITS
+from .cards import SUIT_MASKS
+from .cards import HEARTS_MASK
+from .cards import SPADES_QUEEN_BIT
+
+
+# Keep track of the cards every player may still hold from the plays of a
+# round, for DealSampler to deal only hands that agree with them. A player who
+# does not follow the suit it has to follow is out of that suit. As in
+# HeartsEnv (see simulator.py) that is the lead suit for the followers and the
+# lead suit of the previous trick for the leader of a trick. On the first trick
+# a follower only plays a heart or the queen of spades when it has nothing else.
+class BeliefTracker(object):
+
+    def __init__(self, number_of_players=4):
+        self._number_of_players = number_of_players
+        self.reset()
+
+    def reset(self):
+        self._possible = [ALL_CARDS_MASK] * self._number_of_players
+        self._trick = 0
+        self._position = 0
+        self._lead_suit = -1
+        self._last_lead_suit = -1
+
+    def possible(self, hidden_mask):
+        # the hidden cards every player may hold
+        return [p & hidden_mask for p in self._possible]
+
+    def voids(self, player_id):
+        # the suits player_id is known to be out of
+        return [s for s in range(4) if self._possible[player_id] & SUIT_MASKS[s] == 0]
+
+    def observe(self, player_id, card):
+        possible = self._possible
+        bit = 1 << card
+        for i in range(self._number_of_players):
+            possible[i] &= ~bit
+        suit = SUITS[card]
+        if self._position == 0:
+            if self._trick > 0 and suit != self._last_lead_suit:
+                possible[player_id] &= ~SUIT_MASKS[self._last_lead_suit]
+            self._lead_suit = suit
+        else:
+            if suit != self._lead_suit:
+                possible[player_id] &= ~SUIT_MASKS[self._lead_suit]
+                if self._trick == 0 and bit & (HEARTS_MASK | SPADES_QUEEN_BIT):
+                    possible[player_id] &= HEARTS_MASK | SPADES_QUEEN_BIT
+        self._position += 1
+        if self._position == self._number_of_players:
+            self._position = 0
+            self._trick += 1
+            self._last_lead_suit = self._lead_suit
+
+    def watch(self, observation, info):
+        if info['done'] is True or info['is_new_round'] is True:
+            self.reset()
+        else:
+            self.observe(info['current_player_id'], CARD_TO_INDEX[info['action']])
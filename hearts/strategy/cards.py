@@ -0,0 +1,74 @@
+from treys import Card
+
+
+# Cards are encoded as bit indices: index = suit_index * 13 + rank, with suits in
+# treys order (s, h, d, c). A hand or a set of played cards is a 52-bit int mask.
+# The CARD_* tables answer Card.get_rank_int, the suit and the penalty of a
+# treys card with one dict lookup.
+SUIT_INDEX = {1: 0, 2: 1, 4: 2, 8: 3}
+INDEX_TO_CARD = [0] * 52
+CARD_TO_INDEX = {}
+for _suit_char, _suit_int in Card.CHAR_SUIT_TO_INT_SUIT.items():
+    for _rank_char in Card.STR_RANKS:
+        _card = Card.new(_rank_char + _suit_char)
+        _index = SUIT_INDEX[_suit_int] * 13 + Card.get_rank_int(_card)
+        INDEX_TO_CARD[_index] = _card
+        CARD_TO_INDEX[_card] = _index
+
+RANKS = [i % 13 for i in range(52)]
+SUITS = [i // 13 for i in range(52)]
+
+ALL_CARDS_MASK = (1 << 52) - 1
+RANK_MASK = 0x1FFF
+SUIT_MASKS = [RANK_MASK << (13 * s) for s in range(4)]
+HEARTS_MASK = SUIT_MASKS[SUIT_INDEX[Card.CHAR_SUIT_TO_INT_SUIT['h']]]
+SPADES_QUEEN_BIT = 1 << CARD_TO_INDEX[Card.new('Qs')]
+CLUB_TWO_BIT = 1 << CARD_TO_INDEX[Card.new('2c')]
+PENALTIES = [1 if (HEARTS_MASK >> i) & 1 else 0 for i in range(52)]
+PENALTIES[CARD_TO_INDEX[Card.new('Qs')]] = 13
+
+CARD_RANK = {c: RANKS[i] for c, i in CARD_TO_INDEX.items()}
+CARD_SUIT = {c: SUITS[i] for c, i in CARD_TO_INDEX.items()}
+CARD_PENALTY = {c: PENALTIES[i] for c, i in CARD_TO_INDEX.items()}
+
+
+def cards_to_mask(cards):
+    mask = 0
+    for c in cards:
+        mask |= 1 << CARD_TO_INDEX[c]
+    return mask
+
+
+def mask_to_cards(mask):
+    cards = []
+    while mask:
+        low = mask & -mask
+        cards.append(INDEX_TO_CARD[low.bit_length() - 1])
+        mask ^= low
+    return cards
+
+
+def penalty(mask):
+    score = bin(mask & HEARTS_MASK).count('1')
+    if mask & SPADES_QUEEN_BIT:
+        score += 13
+    return score
+
+
+def _first_of_rank(mask, rank):
+    # the first card in index order with this rank, which is what
+    # list.index() picks when the hand is kept in index order
+    bit = 1 << rank
+    while not (mask & bit):
+        bit <<= 13
+    return bit.bit_length() - 1
+
+
+def min_card(mask):
+    ranks = (mask | (mask >> 13) | (mask >> 26) | (mask >> 39)) & RANK_MASK
+    return _first_of_rank(mask, (ranks & -ranks).bit_length() - 1)
+
+
+def max_card(mask):
+    ranks = (mask | (mask >> 13) | (mask >> 26) | (mask >> 39)) & RANK_MASK
+    return _first_of_rank(mask, ranks.bit_length() - 1)
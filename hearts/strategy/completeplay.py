@@ -1,18 +1,27 @@
+import collections
+
 from gymhearts import strategy
-from gymhearts.evaluator import Evaluator
 
-from treys import Card
+from .profiler import profiler
+from .cards import CARD_RANK
+from .cards import CARD_SUIT
+from .cards import CARD_PENALTY
 
 # Focus on do not loose current trick when we are last player
 # and play smallest card if we are not last player.
 # optimize the rule if we can not win current trick or do not get punish score, drop the worst card
 class CompletePlayStrategy(strategy.IStrategy):
 
-    def __init__(self, first_action_card=None):
-        self._evaluator = Evaluator()
+    # cache_size > 0 keeps the decisions for that many recent positions in an
+    # LRU transposition table, cache_hits and cache_misses count lookups
+    def __init__(self, first_action_card=None, cache_size=0):
         self._first_action_card = first_action_card
+        self._cache_size = cache_size
+        self._cache = collections.OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
 
-    def move(self, observation):
+    def move(self, observation, deadline=None):
 
         # for Lookaheadplaystrategy
         if self._first_action_card is not None:
@@ -20,19 +29,53 @@ class CompletePlayStrategy(strategy.IStrategy):
             self._first_action_card = None
             return first_action_card
 
+        if self._cache_size <= 0:
+            return self._move(observation)
+        key = self._key(observation)
+        cache = self._cache
+        action = cache.get(key)
+        if action is not None:
+            self.cache_hits += 1
+            if profiler.enabled:
+                profiler.add('complete.cache_hits')
+            cache.move_to_end(key)
+            return action
+        self.cache_misses += 1
+        if profiler.enabled:
+            profiler.add('complete.cache_misses')
+        action = self._move(observation)
+        cache[key] = action
+        if len(cache) > self._cache_size:
+            cache.popitem(last=False)
+        return action
+
+    def _key(self, observation):
+        # the move only depends on the valid cards in their order (ties go to
+        # the first one) and, for the last player, on the lead suit, the best
+        # rank of the lead suit and whether the trick has penalty points
+        valid_hand_cards = tuple(observation['valid_hand_cards'])
+        if len(observation['playing_ids']) != observation['number_of_players']-1:
+            return valid_hand_cards
+        playing_cards = observation['playing_cards']
+        first_suit = CARD_SUIT[playing_cards[0]]
+        max_competitor_rank = max(CARD_RANK[c] for c in playing_cards if CARD_SUIT[c] == first_suit)
+        punished = any(CARD_PENALTY[c] for c in playing_cards)
+        return valid_hand_cards, first_suit, max_competitor_rank, punished
+
+    def _move(self, observation):
         number_of_playing_ids = len(observation['playing_ids'])
         valid_hand_cards = observation['valid_hand_cards']
         playing_cards = observation['playing_cards']
-        valid_hand_ranks = [Card.get_rank_int(c) for c in valid_hand_cards]
+        valid_hand_ranks = [CARD_RANK[c] for c in valid_hand_cards]
         min_card_id = valid_hand_ranks.index(min(valid_hand_ranks))
         max_card_id = valid_hand_ranks.index(max(valid_hand_ranks))
 
         # if i am last player in this trick
         if number_of_playing_ids == observation['number_of_players']-1:
-            first_suit = Card.get_suit_int(playing_cards[0])
-            competitor_ranks = [Card.get_rank_int(c) for c in playing_cards if Card.get_suit_int(c) == first_suit]
-            max_suit = Card.get_suit_int(valid_hand_cards[max_card_id])
-            punish_score = self._evaluator.calculate_score(playing_cards)
+            first_suit = CARD_SUIT[playing_cards[0]]
+            competitor_ranks = [CARD_RANK[c] for c in playing_cards if CARD_SUIT[c] == first_suit]
+            max_suit = CARD_SUIT[valid_hand_cards[max_card_id]]
+            punish_score = sum(CARD_PENALTY[c] for c in playing_cards)
             # we do not have same suit card, so just drop max card. it does not get punish score
             if (max_suit != first_suit) or (punish_score == 0):
                 return valid_hand_cards[max_card_id]
@@ -0,0 +1,259 @@
+import time
+
+from .profiler import profiler
+from .cards import RANKS
+from .cards import SUITS
+from .cards import SUIT_MASKS
+from .cards import PENALTIES
+
+
+# Exact search of the last tricks of a round on one concrete deal, the open
+# hands version of a rollout. Values are the points the player we solve for
+# takes from the current position to the end of the round.
+#
+# By default every player plays for its own points (max^n) and breaks ties
+# against the player we solve for. With paranoid=True the others play to give
+# that player as many points as they can instead, which is a two player game
+# and lets alpha-beta prune, but it is pessimistic.
+#
+# Positions at the start of a trick go into a transposition table. The
+# paranoid search stores the bound a position was searched with and the card
+# that was best there, which is tried first the next time. Other cards are
+# tried in an order that finds cutoffs early: penalty cards and high ranks first.
+#
+# Follows the same rules as HeartsSimulator, only from the second trick on.
+
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+
+def _ordered(valid):
+    # penalty cards first, then by rank from high to low
+    cards = []
+    while valid:
+        low = valid & -valid
+        cards.append(low.bit_length() - 1)
+        valid ^= low
+    cards.sort(key=lambda c: (PENALTIES[c], RANKS[c]), reverse=True)
+    return cards
+
+
+class EndgameSolver(object):
+
+    def __init__(self, number_of_players=4, table_size=1 << 18, paranoid=False):
+        self._number_of_players = number_of_players
+        self._paranoid = paranoid
+        self._table_size = table_size
+        self._table = {}
+        self.nodes = 0
+        self.elapsed = 0.0
+
+    def nodes_per_second(self):
+        if self.elapsed == 0.0:
+            return 0.0
+        return self.nodes / self.elapsed
+
+    def solve(self, simulator, player_id, first_card=None):
+        # points player_id takes from the simulator position to the end of the
+        # round, with first_card as the next card if given; the simulator is
+        # not changed. The round has to be past its first trick.
+        start = time.perf_counter()
+        nodes = self.nodes
+        if len(self._table) > self._table_size:
+            self._table.clear()
+        hands = list(simulator.hands)
+        playing_cards = simulator.playing_cards
+        lead_suit = -1
+        winner_rank = -1
+        winner_id = -1
+        if len(playing_cards) > 0:
+            lead_suit = SUITS[playing_cards[0]]
+            for card, card_player_id in zip(playing_cards, simulator.playing_ids):
+                if SUITS[card] == lead_suit and RANKS[card] > winner_rank:
+                    winner_rank = RANKS[card]
+                    winner_id = card_player_id
+        only = simulator.valid_mask()
+        if first_card is not None:
+            only = 1 << first_card
+        trick_points = sum(PENALTIES[c] for c in playing_cards)
+        if self._paranoid:
+            value = self._search(
+                hands, player_id, simulator.current_player_id, len(playing_cards), lead_suit, trick_points,
+                winner_rank, winner_id, simulator._lead_suit, -1, 1 << 30, only,
+            )
+        else:
+            value = self._search_maxn(
+                hands, player_id, simulator.current_player_id, len(playing_cards), lead_suit, trick_points,
+                winner_rank, winner_id, simulator._lead_suit, only,
+            )[player_id]
+        elapsed = time.perf_counter() - start
+        self.elapsed += elapsed
+        if profiler.enabled:
+            profiler.add('endgame.solves')
+            profiler.add('endgame.nodes', self.nodes - nodes)
+            profiler.add('endgame.seconds', elapsed)
+        return value
+
+    def _search(
+        self, hands, me, player_id, position, lead_suit, trick_points, winner_rank, winner_id, last_lead_suit,
+        alpha, beta, only=0,
+    ):
+        self.nodes += 1
+        number_of_players = self._number_of_players
+        key = None
+        best_card = -1
+        if position == 0:
+            if hands[player_id] == 0:
+                return 0
+            if only == 0:
+                key = (me, player_id, last_lead_suit) + tuple(hands)
+                entry = self._table.get(key)
+                if entry is not None:
+                    value, bound, best_card = entry
+                    if bound == EXACT:
+                        return value
+                    if bound == LOWER and value >= beta:
+                        return value
+                    if bound == UPPER and value <= alpha:
+                        return value
+            suit = last_lead_suit
+        else:
+            suit = lead_suit
+        hand = hands[player_id]
+        if only:
+            valid = only
+        else:
+            valid = hand & SUIT_MASKS[suit]
+            if valid == 0:
+                valid = hand
+        cards = _ordered(valid)
+        if best_card != -1 and (valid >> best_card) & 1:
+            cards.remove(best_card)
+            cards.insert(0, best_card)
+        minimizing = player_id == me
+        alpha_start = alpha
+        beta_start = beta
+        best_value = 1 << 30 if minimizing else -1
+        best_card = cards[0]
+        for card in cards:
+            bit = 1 << card
+            hands[player_id] = hand & ~bit
+            rank = RANKS[card]
+            if position == 0:
+                card_lead_suit = SUITS[card]
+                card_winner_rank = rank
+                card_winner_id = player_id
+            else:
+                card_lead_suit = lead_suit
+                card_winner_rank = winner_rank
+                card_winner_id = winner_id
+                if SUITS[card] == lead_suit and rank > winner_rank:
+                    card_winner_rank = rank
+                    card_winner_id = player_id
+            points = trick_points + PENALTIES[card]
+            if position == number_of_players - 1:
+                # the points of this trick shift the window of the rest
+                taken = points if card_winner_id == me else 0
+                value = taken + self._search(
+                    hands, me, card_winner_id, 0, -1, 0, -1, -1, card_lead_suit, alpha - taken, beta - taken,
+                )
+            else:
+                value = self._search(
+                    hands, me, (player_id + 1) % number_of_players, position + 1, card_lead_suit, points,
+                    card_winner_rank, card_winner_id, last_lead_suit, alpha, beta,
+                )
+            hands[player_id] = hand
+            if minimizing:
+                if value < best_value:
+                    best_value = value
+                    best_card = card
+                if best_value < beta:
+                    beta = best_value
+            else:
+                if value > best_value:
+                    best_value = value
+                    best_card = card
+                if best_value > alpha:
+                    alpha = best_value
+            if alpha >= beta:
+                break
+        if key is not None:
+            if best_value <= alpha_start:
+                bound = UPPER
+            elif best_value >= beta_start:
+                bound = LOWER
+            else:
+                bound = EXACT
+            self._table[key] = (best_value, bound, best_card)
+        return best_value
+
+    def _search_maxn(
+        self, hands, me, player_id, position, lead_suit, trick_points, winner_rank, winner_id, last_lead_suit, only=0,
+    ):
+        # the points every player takes from here to the end of the round when
+        # each player plays for its own points, a tie goes to the card that
+        # leaves the most points to me (or the fewest to the others, for me)
+        self.nodes += 1
+        number_of_players = self._number_of_players
+        key = None
+        if position == 0:
+            if hands[player_id] == 0:
+                return (0,) * number_of_players
+            if only == 0:
+                key = (-1 - me, player_id, last_lead_suit) + tuple(hands)
+                values = self._table.get(key)
+                if values is not None:
+                    return values
+            suit = last_lead_suit
+        else:
+            suit = lead_suit
+        hand = hands[player_id]
+        if only:
+            valid = only
+        else:
+            valid = hand & SUIT_MASKS[suit]
+            if valid == 0:
+                valid = hand
+        best_values = None
+        best_order = None
+        while valid:
+            low = valid & -valid
+            valid ^= low
+            card = low.bit_length() - 1
+            hands[player_id] = hand & ~low
+            rank = RANKS[card]
+            if position == 0:
+                card_lead_suit = SUITS[card]
+                card_winner_rank = rank
+                card_winner_id = player_id
+            else:
+                card_lead_suit = lead_suit
+                card_winner_rank = winner_rank
+                card_winner_id = winner_id
+                if SUITS[card] == lead_suit and rank > winner_rank:
+                    card_winner_rank = rank
+                    card_winner_id = player_id
+            points = trick_points + PENALTIES[card]
+            if position == number_of_players - 1:
+                values = self._search_maxn(hands, me, card_winner_id, 0, -1, 0, -1, -1, card_lead_suit)
+                if points:
+                    values = list(values)
+                    values[card_winner_id] += points
+                    values = tuple(values)
+            else:
+                values = self._search_maxn(
+                    hands, me, (player_id + 1) % number_of_players, position + 1, card_lead_suit, points,
+                    card_winner_rank, card_winner_id, last_lead_suit,
+                )
+            hands[player_id] = hand
+            if player_id == me:
+                order = (values[me], -sum(values))
+            else:
+                order = (values[player_id], -values[me])
+            if best_order is None or order < best_order:
+                best_order = order
+                best_values = values
+        if key is not None:
+            self._table[key] = best_values
+        return best_values
@@ -3,6 +3,6 @@ from gymhearts import strategy
 
 class FirstPlayStrategy(strategy.IStrategy):
 
-    def move(self, observation):
+    def move(self, observation, deadline=None):
         action = observation['valid_hand_cards'][0]
         return action
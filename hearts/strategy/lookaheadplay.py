@@ -1,13 +1,90 @@
+import math
+import time
 import random
-import gym
-from gymhearts import env as hearts_env
+import concurrent.futures
 from gymhearts import strategy
-from gymhearts.evaluator import Evaluator
 
-from treys import Deck
-from treys import Card
+from .profiler import profiler
+from .sampler import DealSampler
+from .simulator import HeartsSimulator
+from .endgame import EndgameSolver
+from .belief import BeliefTracker
+from .cards import ALL_CARDS_MASK
+from .cards import CARD_RANK
+from .cards import CARD_SUIT
+from .cards import CARD_PENALTY
+from .cards import CARD_TO_INDEX
+from .cards import cards_to_mask
 
-from .completeplay import CompletePlayStrategy
+
+_worker_simulator = None
+_worker_sampler = None
+_worker_solver = None
+
+
+def _init_worker():
+    global _worker_simulator
+    global _worker_sampler
+    global _worker_solver
+    _worker_simulator = HeartsSimulator()
+    _worker_sampler = DealSampler()
+    _worker_solver = EndgameSolver()
+
+
+def _warm_worker(_):
+    return _worker_simulator is not None
+
+
+def _simulate_in_worker(expanded_card, observation, hidden_mask, possible, seed, count, endgame, time_left):
+    # every task carries its own seed so a run does not depend on which
+    # worker picks it up, and the time it has left since clocks are per process
+    _worker_sampler.seed(seed)
+    _worker_sampler.reset(hidden_mask, possible)
+    solver = _worker_solver if endgame else None
+    deadline = None
+    if time_left is not None:
+        deadline = time.perf_counter() + time_left
+    return simulate(_worker_simulator, _worker_sampler, expanded_card, observation, count, solver, deadline)
+
+
+def create_executor(workers):
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+    # start every worker now instead of on the first move
+    list(executor.map(_warm_worker, range(workers)))
+    return executor
+
+
+# deal the hidden cards loaded in sampler to competitors and
+# play util finish the round with complete strategy as default policy,
+# or solve the rest of the round exactly when an endgame solver is given.
+# After the first one no more rollouts are started once deadline has passed.
+def simulate(simulator, sampler, expanded_card, observation, count=1, solver=None, deadline=None):
+    current_player_id = observation['current_player_id']
+    number_of_hand_cards_for_all_players = observation['number_of_hand_cards_for_all_players']
+    hand_mask = cards_to_mask(observation['hand_cards'])
+    first_card = CARD_TO_INDEX[expanded_card]
+    scores = []
+    profiling = profiler.enabled
+    for _ in range(count):
+        if deadline is not None and len(scores) > 0 and time.perf_counter() >= deadline:
+            break
+        if profiling:
+            start = time.perf_counter()
+        hands = sampler.deal(number_of_hand_cards_for_all_players, current_player_id)
+        hands[current_player_id] = hand_mask
+        simulator.reset(observation, hands)
+        if profiling:
+            dealt = time.perf_counter()
+        if solver is not None:
+            scores.append(simulator.scores[current_player_id] + solver.solve(simulator, current_player_id, first_card))
+        else:
+            scores.append(simulator.rollout(first_card)[current_player_id])
+        if profiling:
+            profiler.add('lookahead.deal.seconds', dealt - start)
+            profiler.add('lookahead.rollout.seconds', time.perf_counter() - dealt)
+    if profiling:
+        profiler.add('lookahead.rollouts', len(scores))
+    return scores
 
 
 # Focus on do not loose current trick when we are last player
@@ -15,25 +92,58 @@ from .completeplay import CompletePlayStrategy
 # optimize the rule if we can not win current trick or do not get punish score, drop the worst card
 class LookAheadPlayStrategy(strategy.IStrategy):
 
-    def __init__(self):
-        self._evaluator = Evaluator()
-        deck = Deck()
-        self._available_cards = deck.draw(52)
+    # rollouts is the most rollouts per card and time_limit the seconds per move,
+    # rollouts run in batches of batch_size and a card stops getting rollouts
+    # once it is worse than the best card by confidence standard errors.
+    # workers > 0 spreads the per-card rollouts over a process pool which is
+    # kept alive across moves, pass executor to share one pool between players.
+    # From endgame_cards cards left in hand on every deal is solved exactly
+    # instead of played out, 0 turns the endgame solver off. With beliefs the
+    # deals keep to the suits the other players have shown to be out of.
+    def __init__(
+        self, rollouts=1, time_limit=None, batch_size=8, confidence=2.0, workers=0, seed=None, executor=None,
+        endgame_cards=2, beliefs=True,
+    ):
+        self._rollouts = rollouts
+        self._time_limit = time_limit
+        self._batch_size = batch_size
+        self._confidence = confidence
+        self._simulator = HeartsSimulator()
+        self._endgame_cards = endgame_cards
+        self._solver = EndgameSolver()
+        self._random = random.Random(seed)
+        self._sampler = DealSampler(self._random.getrandbits(32))
+        self._executor = executor
+        self._owns_executor = False
+        if executor is None and workers > 0:
+            self._executor = create_executor(workers)
+            self._owns_executor = True
+        self._available_mask = ALL_CARDS_MASK
+        self._belief = BeliefTracker() if beliefs else None
+        self.last_rollouts = 0
+
+    def close(self):
+        if self._owns_executor is True:
+            self._executor.shutdown()
+        self._executor = None
 
-    def move(self, observation):
+    # deadline is a time.perf_counter() value to stop the rollouts at, on top
+    # of time_limit; every card gets at least one rollout
+    def move(self, observation, deadline=None):
+        self.last_rollouts = 0
         number_of_playing_ids = len(observation['playing_ids'])
         valid_hand_cards = observation['valid_hand_cards']
         playing_cards = observation['playing_cards']
-        valid_hand_ranks = [Card.get_rank_int(c) for c in valid_hand_cards]
+        valid_hand_ranks = [CARD_RANK[c] for c in valid_hand_cards]
         min_card_id = valid_hand_ranks.index(min(valid_hand_ranks))
         max_card_id = valid_hand_ranks.index(max(valid_hand_ranks))
 
         # if i am last player in this trick
         if number_of_playing_ids == observation['number_of_players']-1:
-            first_suit = Card.get_suit_int(playing_cards[0])
-            competitor_ranks = [Card.get_rank_int(c) for c in playing_cards if Card.get_suit_int(c) == first_suit]
-            max_suit = Card.get_suit_int(valid_hand_cards[max_card_id])
-            punish_score = self._evaluator.calculate_score(playing_cards)
+            first_suit = CARD_SUIT[playing_cards[0]]
+            competitor_ranks = [CARD_RANK[c] for c in playing_cards if CARD_SUIT[c] == first_suit]
+            max_suit = CARD_SUIT[valid_hand_cards[max_card_id]]
+            punish_score = sum(CARD_PENALTY[c] for c in playing_cards)
             # we do not have same suit card, so just drop max card. it does not get punish score
             if (max_suit != first_suit) or (punish_score == 0):
                 return valid_hand_cards[max_card_id]
@@ -52,56 +162,101 @@ class LookAheadPlayStrategy(strategy.IStrategy):
                 return valid_hand_cards[max_safe_card_id]
         # apply monte carlo sampling to estimate win rate of valid hand cards
         else:
-            simulated_scores = [self._simulate(card, observation) for card in valid_hand_cards]
-            best_card_id = simulated_scores.index(min(simulated_scores))
+            best_card_id = self._estimate(valid_hand_cards, observation, deadline)
             return valid_hand_cards[best_card_id]
 
+    def _hidden_mask(self, observation):
+        return self._available_mask & ~cards_to_mask(observation['hand_cards'])
+
+    def _possible(self, hidden_mask):
+        if self._belief is None:
+            return None
+        return self._belief.possible(hidden_mask)
+
+    def _endgame(self, observation):
+        # the solver follows the rules from the second trick on
+        return observation['trick'] > 0 and len(observation['hand_cards']) <= self._endgame_cards
+
+    def endgame_nodes_per_second(self):
+        return self._solver.nodes_per_second()
+
     def _simulate(self, expanded_card, observation):
-        number_of_players = observation['number_of_players']
-        number_of_hand_cards_for_all_players = observation['number_of_hand_cards_for_all_players']
-        current_player_id = observation['current_player_id']
-        competitor_cards = self._available_cards.copy()
-        hand_cards = observation['hand_cards'].copy()
-        for c in hand_cards:
-            competitor_cards.remove(c)
-        random.shuffle(competitor_cards)
-        # clone the env and players
-        Deck._FULL_DECK = competitor_cards
-        deck = Deck()
-        Deck._FULL_DECK = []
-        env = hearts_env.HeartsEnv()
-        for player_id in range(0, number_of_players):
-            if player_id == current_player_id:
-                env.add_player(hand_cards=hand_cards, strategy=CompletePlayStrategy(first_action_card=expanded_card))
-            else:
-                cards = deck.draw(number_of_hand_cards_for_all_players[player_id])
-                if number_of_hand_cards_for_all_players[player_id] == 1:
-                    cards = [cards]
-                env.add_player(
-                    hand_cards=cards, 
-                    strategy=CompletePlayStrategy()
-                )
-        env.copy_observation(observation)
-        env.start()
-        simulated_observation = env.get_observation()
-        # play util finish the round and use complete strategy as default policy
-        is_new_round = False
-        done = False
-        while (not is_new_round) and (not done):
-            action = env.move()
-            simulated_observation, reward, done, info = env.step(action)
-            is_new_round = info['is_new_round']
-        score = simulated_observation['scores'][current_player_id]
-        return score
+        hidden_mask = self._hidden_mask(observation)
+        self._sampler.reset(hidden_mask, self._possible(hidden_mask))
+        solver = self._solver if self._endgame(observation) else None
+        return simulate(self._simulator, self._sampler, expanded_card, observation, 1, solver)[0]
+
+    def _simulate_all(self, cards, observation, count, deadline=None):
+        hidden_mask = self._hidden_mask(observation)
+        possible = self._possible(hidden_mask)
+        endgame = self._endgame(observation)
+        if self._executor is None:
+            self._sampler.reset(hidden_mask, possible)
+            solver = self._solver if endgame else None
+            return [
+                simulate(self._simulator, self._sampler, card, observation, count, solver, deadline) for card in cards
+            ]
+        time_left = None
+        if deadline is not None:
+            time_left = max(0.0, deadline - time.perf_counter())
+        futures = [
+            self._executor.submit(
+                _simulate_in_worker, card, observation, hidden_mask, possible, self._random.getrandbits(32), count,
+                endgame, time_left,
+            )
+            for card in cards
+        ]
+        return [f.result() for f in futures]
+
+    def _estimate(self, cards, observation, deadline=None):
+        # run rollouts in batches and stop spending them on a card once its
+        # confidence interval lies above the interval of the best card
+        if self._time_limit is not None:
+            if deadline is None or time.perf_counter() + self._time_limit < deadline:
+                deadline = time.perf_counter() + self._time_limit
+        rollouts = self._rollouts
+        if rollouts is None and deadline is None:
+            rollouts = 1
+        counts = [0] * len(cards)
+        totals = [0.0] * len(cards)
+        squares = [0.0] * len(cards)
+        alive = list(range(len(cards)))
+        while True:
+            count = self._batch_size
+            if rollouts is not None:
+                count = min(count, rollouts - counts[alive[0]])
+            results = self._simulate_all([cards[i] for i in alive], observation, count, deadline)
+            for i, scores in zip(alive, results):
+                counts[i] += len(scores)
+                totals[i] += sum(scores)
+                squares[i] += sum(s * s for s in scores)
+            means = [totals[i] / counts[i] for i in range(len(cards))]
+            # a deadline can stop a batch early, so counts may differ
+            if len(alive) > 1 and min(counts[i] for i in alive) > 1:
+                margins = {}
+                for i in alive:
+                    variance = max(squares[i] - totals[i] * means[i], 0.0) / (counts[i] - 1)
+                    margins[i] = self._confidence * math.sqrt(variance / counts[i])
+                best = min(alive, key=lambda i: means[i])
+                alive = [i for i in alive if means[i] - margins[i] <= means[best] + margins[best]]
+            if len(alive) == 1:
+                break
+            if rollouts is not None and counts[alive[0]] >= rollouts:
+                break
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+        self.last_rollouts = sum(counts)
+        return min(alive, key=lambda i: means[i])
 
     def watch(self, observation, info):
+        if self._belief is not None:
+            self._belief.watch(observation, info)
         if info['done'] is True:
             pass
         elif info['is_new_round'] is True:
-            deck = Deck()
-            self._available_cards = deck.draw(52)
+            self._available_mask = ALL_CARDS_MASK
         else:
             played_card = info['action']
-            self._available_cards.remove(played_card)
+            self._available_mask &= ~(1 << CARD_TO_INDEX[played_card])
         
 
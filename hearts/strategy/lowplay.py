@@ -1,13 +1,13 @@
 from gymhearts import strategy
 
-from treys import Card
+from .cards import CARD_RANK
 
 
 class LowPlayStrategy(strategy.IStrategy):
 
-    def move(self, observation):
+    def move(self, observation, deadline=None):
         valid_hand_cards = observation['valid_hand_cards']
-        valid_hand_ranks = [Card.get_rank_int(c) for c in valid_hand_cards]
+        valid_hand_ranks = [CARD_RANK[c] for c in valid_hand_cards]
         min_card_id = valid_hand_ranks.index(min(valid_hand_ranks))
         return valid_hand_cards[min_card_id]
 
@@ -1,172 +1,468 @@
 import random
 import math
-import hashlib
+import time
+from array import array
 
-from treys import Card
+import numpy
+
+from .profiler import profiler
 
 """
 A quick Monte Carlo Tree Search implementation.  For more details on MCTS see See http://pubs.doc.ic.ac.uk/survey-mcts-methods/survey-mcts-methods.pdf
 
-The State is just a game where you have NUM_TURNS and at turn i you can make
-a choice from [-2,2,3,-3]*i and this to to an accumulated value.  The goal is for the accumulated value to be as close to 0 as possible.
-
-The game is not very interesting but it allows one to study MCTS which is.  Some features 
-of the example by design are that moves do not commute and early mistakes are more costly.  
+The search is information set MCTS: the tree is built over the moves the searching
+player can tell apart, and every iteration samples one concrete game (IGame) that is
+consistent with what the player knows. The iteration only walks the children whose
+move is legal in that game, expands one untried legal move, plays the game out with
+its default policy and backs up the rewards. Each node keeps the reward of the player
+who made its move, so every player picks the moves that are best for itself.
 
-In particular there are two models of best child that one can use 
+Children are compared by their availability (how often their move was legal when the
+parent was visited) instead of the parent visits, since not every move is legal in
+every sampled game.
 """
 
 
 class IState(object):
 
-    def next_state(self):
+    # the state at the root of a search, tree nodes only keep a 64-bit key
+    # of the moves that lead to them
+    key = 0
+
+    def next_key(self, key, depth, move):
+        # key after move is played by the node depth moves below this state
         raise NotImplementedError()
 
-    def terminal(self):
+    def determinize(self, observation):
+        # sample a concrete IGame for one iteration
         raise NotImplementedError()
 
-    def reward(self):
+    def fork(self, seed):
+        # an independent copy with its own random stream, for parallel search
         raise NotImplementedError()
 
 
-class State(IState):
-    NUM_TURNS = 10    
-    GOAL = 0
-    MOVES=[2,-2,3,-3]
-    MAX_VALUE= (5.0*(NUM_TURNS-1)*NUM_TURNS)/2
-    num_moves=len(MOVES)
-    
-    def __init__(self, value=0, moves=[], turn=NUM_TURNS):
-        self.value = value
-        self.turn = turn
-        self.moves = moves
-    
-    def next_state(self):
-        next_move = random.choice([x*self.turn for x  in self.MOVES])
-        next_state = State(self.value+next_move, self.moves+[next_move], self.turn-1)
-        return next
-    
+class IGame(object):
+
+    def player_id(self):
+        raise NotImplementedError()
+
+    def moves(self):
+        raise NotImplementedError()
+
+    def play(self, move):
+        raise NotImplementedError()
+
+    def default_move(self):
+        raise NotImplementedError()
+
     def terminal(self):
-        if self.turn == 0:
-            return True
-        return False
-    
+        raise NotImplementedError()
+
+    def rewards(self):
+        # one reward in [0, 1] per player
+        raise NotImplementedError()
+
+    def prior(self, move, number_of_moves):
+        # prior probability of move among the legal moves, used by PUCT
+        return 1.0 / number_of_moves
+
+    def playout(self):
+        while self.terminal() is False:
+            self.play(self.default_move())
+
+
+# Visits, rewards and links of every node live in preallocated array buffers,
+# indexed by node number. Children of a node are a linked list through
+# first_child and next_sibling, node 0 is the root. Moves must be small ints.
+class TreeStore(object):
+
+    def __init__(self, state, capacity=1024):
+        self.state = state
+        self.size = 0
+        self._capacity = 0
+        self.visits = array('i')
+        self.avails = array('i')
+        self.reward = array('d')
+        self.square = array('d')
+        self.prior = array('f')
+        self.parent = array('i')
+        self.first_child = array('i')
+        self.next_sibling = array('i')
+        self.key = array('Q')
+        self.depth = array('h')
+        self.move = array('h')
+        self.player_id = array('b')
+        self._grow(capacity)
+        self.add(-1, state.key, -1, -1, 1.0)
+
+    def _grow(self, capacity):
+        extra = capacity - self._capacity
+        for buffer in (self.visits, self.avails, self.parent, self.first_child, self.next_sibling):
+            buffer.extend(array('i', [0]) * extra)
+        self.reward.extend(array('d', [0.0]) * extra)
+        self.square.extend(array('d', [0.0]) * extra)
+        self.prior.extend(array('f', [0.0]) * extra)
+        self.key.extend(array('Q', [0]) * extra)
+        self.depth.extend(array('h', [0]) * extra)
+        self.move.extend(array('h', [0]) * extra)
+        self.player_id.extend(array('b', [0]) * extra)
+        self._capacity = capacity
+
+    def add(self, parent, key, move, player_id, prior):
+        index = self.size
+        if index == self._capacity:
+            self._grow(2 * self._capacity)
+        self.size += 1
+        self.visits[index] = 1
+        self.avails[index] = 1
+        self.reward[index] = 0.0
+        self.square[index] = 0.0
+        self.prior[index] = prior
+        self.parent[index] = parent
+        self.first_child[index] = -1
+        self.key[index] = key
+        self.move[index] = move
+        self.player_id[index] = player_id
+        if parent == -1:
+            self.next_sibling[index] = -1
+            self.depth[index] = 0
+        else:
+            self.next_sibling[index] = self.first_child[parent]
+            self.first_child[parent] = index
+            self.depth[index] = self.depth[parent] + 1
+        return index
+
+    def children(self, index):
+        children = []
+        child = self.first_child[index]
+        while child != -1:
+            children.append(child)
+            child = self.next_sibling[child]
+        return children
+
+    def root(self):
+        return Node(self, 0)
+
+    def subtree(self, index, state):
+        # a compact copy of the subtree under index with its statistics,
+        # rooted at state; whatever is not below index is left behind
+        tree = TreeStore(state)
+        stack = [(index, 0)]
+        while stack:
+            old, new = stack.pop()
+            tree.visits[new] = self.visits[old]
+            tree.avails[new] = self.avails[old]
+            tree.reward[new] = self.reward[old]
+            tree.square[new] = self.square[old]
+            # add() puts a child first, so walk the children backwards
+            for child in reversed(self.children(old)):
+                stack.append((child, tree.add(
+                    new, self.key[child], self.move[child], self.player_id[child], self.prior[child]
+                )))
+        return tree
+
+    def find_child(self, index, move):
+        child = self.first_child[index]
+        while child != -1 and self.move[child] != move:
+            child = self.next_sibling[child]
+        return child
+
+    def nbytes(self):
+        buffers = (
+            self.visits, self.avails, self.reward, self.square, self.prior, self.parent, self.first_child,
+            self.next_sibling, self.key, self.depth, self.move, self.player_id,
+        )
+        return sum(b.itemsize * len(b) for b in buffers)
+
+
+# a lightweight handle on one node of a TreeStore
+class Node(object):
+
+    __slots__ = ('tree', 'index')
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+
+    @property
+    def visits(self):
+        return self.tree.visits[self.index]
+
+    @property
+    def avails(self):
+        return self.tree.avails[self.index]
+
+    @property
     def reward(self):
-        r = 1.0-(abs(self.value-self.GOAL)/self.MAX_VALUE)
-        return r
-    
-    def __hash__(self):
-        return int(hashlib.md5(str(self.moves).encode('utf-8')).hexdigest(),16)
-    
-    def __eq__(self,other):
-        if hash(self) == hash(other):
-            return True
-        return False
-    
-    def __repr__(self):
-        s="Value: %d; Moves: %s"%(self.value,self.moves)
-        return s
-    
-
-class Node():
-
-    def __init__(self, state, parent=None):
-        self.visits=1
-        self.reward=0.0    
-        self.state=state
-        self.children=[]
-        self.parent=parent    
-    
-    def add_child(self, child_state):
-        for child in self.children:
-            if child.state == child_state:
-                return
-        child=Node(child_state, self)
-        self.children.append(child)
- 
-    def move_to_child(self, child_state):
-        self.add_child(child_state)
-        for child in self.children:
-            if child.state == child_state:
-                return child
-        raise Exception('can not find child')
-
-    def update(self, reward):
-        self.reward+=reward
-        self.visits+=1
-    
-    def fully_expanded(self):
-        if len(self.children) == self.state.num_moves:
-            return True
-        return False
-    
+        return self.tree.reward[self.index]
+
+    @property
+    def key(self):
+        return self.tree.key[self.index]
+
+    @property
+    def move(self):
+        move = self.tree.move[self.index]
+        return None if move == -1 else move
+
+    @property
+    def player_id(self):
+        player_id = self.tree.player_id[self.index]
+        return None if player_id == -1 else player_id
+
+    @property
+    def parent(self):
+        parent = self.tree.parent[self.index]
+        return None if parent == -1 else Node(self.tree, parent)
+
+    @property
+    def children(self):
+        return [Node(self.tree, c) for c in self.tree.children(self.index)]
+
     def __repr__(self):
         s="Node; children: %d; visits: %d; reward: %f"%(len(self.children),self.visits,self.reward)
         return s
-        
+
+
+# A selection policy scores children for BESTCHILD, one child at a time with
+# score() or all at once with scores() on numpy arrays. In an information set
+# search the availability of a child stands in for the visits of its parent,
+# log and square root of availabilities come from tables grown on demand.
+class SelectionPolicy(object):
+
+    def __init__(self):
+        self._log = array('d', [0.0])
+        self._sqrt = array('d', [0.0])
+
+    def _grow_tables(self, n):
+        size = len(self._log)
+        if n >= size:
+            size = max(n + 1, 2 * size)
+            self._log = array('d', [0.0] + [math.log(i) for i in range(1, size)])
+            self._sqrt = array('d', [math.sqrt(i) for i in range(size)])
+
+    def score(self, tree, child, scalar):
+        raise NotImplementedError()
+
+    def scores(self, tree, children, scalar):
+        raise NotImplementedError()
+
+
+class UCB1(SelectionPolicy):
+
+    def score(self, tree, child, scalar):
+        avails = tree.avails[child]
+        if avails >= len(self._log):
+            self._grow_tables(avails)
+        visits = tree.visits[child]
+        return tree.reward[child] / visits + scalar * math.sqrt(2.0 * self._log[avails] / visits)
+
+    def scores(self, tree, children, scalar):
+        visits = numpy.frombuffer(tree.visits, numpy.int32)[children]
+        rewards = numpy.frombuffer(tree.reward, numpy.float64)[children]
+        avails = numpy.frombuffer(tree.avails, numpy.int32)[children]
+        return rewards / visits + scalar * numpy.sqrt(2.0 * numpy.log(avails) / visits)
+
+
+# UCB1 with the exploration term scaled by an upper bound on the reward variance
+class UCB1Tuned(SelectionPolicy):
+
+    def score(self, tree, child, scalar):
+        avails = tree.avails[child]
+        if avails >= len(self._log):
+            self._grow_tables(avails)
+        visits = tree.visits[child]
+        log_avails = self._log[avails]
+        mean = tree.reward[child] / visits
+        variance = tree.square[child] / visits - mean * mean + math.sqrt(2.0 * log_avails / visits)
+        return mean + scalar * math.sqrt(log_avails / visits * min(0.25, max(0.0, variance)))
+
+    def scores(self, tree, children, scalar):
+        visits = numpy.frombuffer(tree.visits, numpy.int32)[children]
+        rewards = numpy.frombuffer(tree.reward, numpy.float64)[children]
+        squares = numpy.frombuffer(tree.square, numpy.float64)[children]
+        log_avails = numpy.log(numpy.frombuffer(tree.avails, numpy.int32)[children])
+        means = rewards / visits
+        variances = squares / visits - means * means + numpy.sqrt(2.0 * log_avails / visits)
+        return means + scalar * numpy.sqrt(log_avails / visits * numpy.clip(variances, 0.0, 0.25))
+
+
+# the AlphaZero rule, exploration follows the prior IGame.prior gave the move
+class PUCT(SelectionPolicy):
+
+    def score(self, tree, child, scalar):
+        avails = tree.avails[child]
+        if avails >= len(self._sqrt):
+            self._grow_tables(avails)
+        visits = tree.visits[child]
+        return tree.reward[child] / visits + scalar * tree.prior[child] * self._sqrt[avails] / visits
+
+    def scores(self, tree, children, scalar):
+        visits = numpy.frombuffer(tree.visits, numpy.int32)[children]
+        rewards = numpy.frombuffer(tree.reward, numpy.float64)[children]
+        priors = numpy.frombuffer(tree.prior, numpy.float32)[children].astype(numpy.float64)
+        avails = numpy.frombuffer(tree.avails, numpy.int32)[children]
+        return rewards / visits + scalar * priors * numpy.sqrt(avails) / visits
+
 
 class MCTS(object):
-    
-    def __init__(self, budget):
+
+    VECTORIZE_MIN_CHILDREN = 32
+
+    def __init__(self, budget, time_limit=None, seed=None, policy=None):
         self._budget = budget
+        self._policy = policy if policy is not None else UCB1()
+        self._time_limit = time_limit
+        self._random = random.Random(seed)
         self.SCALAR = 1 / math.sqrt(2.0) # larger scalar will increase exploitation, smaller will increase exploration
+        self.iterations = 0
+        self.elapsed = 0.0
+
+    # deadline is a time.perf_counter() value to stop at, on top of time_limit
+    def UCTSEARCH(self, root, observation, deadline=None):
+        if profiler.enabled:
+            return self._profiled_search(root, observation, deadline)
+        tree = root.tree
+        start = time.perf_counter()
+        deadline = self._deadline(start, deadline)
+        iterations = 0
+        while True:
+            game = tree.state.determinize(observation)
+            front = self.TREEPOLICY(tree, root.index, game)
+            rewards = self.DEFAULTPOLICY(game)
+            self.BACKUP(tree, front, rewards)
+            iterations += 1
+            if iterations >= self._budget:
+                break
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+        self.iterations = iterations
+        self.elapsed = time.perf_counter() - start
+        return Node(tree, self.BESTCHILD(tree, root.index, 0))
+
+    def _profiled_search(self, root, observation, deadline):
+        # UCTSEARCH with every phase timed, selection and expansion are both
+        # part of TREEPOLICY and counted by the nodes they add
+        tree = root.tree
+        start = time.perf_counter()
+        deadline = self._deadline(start, deadline)
+        size = tree.size
+        phases = [0.0] * 4
+        depth = 0
+        iterations = 0
+        while True:
+            t0 = time.perf_counter()
+            game = tree.state.determinize(observation)
+            t1 = time.perf_counter()
+            front = self.TREEPOLICY(tree, root.index, game)
+            t2 = time.perf_counter()
+            rewards = self.DEFAULTPOLICY(game)
+            t3 = time.perf_counter()
+            self.BACKUP(tree, front, rewards)
+            t4 = time.perf_counter()
+            phases[0] += t1 - t0
+            phases[1] += t2 - t1
+            phases[2] += t3 - t2
+            phases[3] += t4 - t3
+            depth = max(depth, tree.depth[front] - tree.depth[root.index])
+            iterations += 1
+            if iterations >= self._budget:
+                break
+            if deadline is not None and t4 >= deadline:
+                break
+        self.iterations = iterations
+        self.elapsed = time.perf_counter() - start
+        for name, seconds in zip(('determinize', 'treepolicy', 'defaultpolicy', 'backup'), phases):
+            profiler.add('mcts.' + name + '.seconds', seconds)
+        profiler.add('mcts.iterations', iterations)
+        profiler.add('mcts.expanded', tree.size - size)
+        profiler.peak('mcts.depth.max', depth)
+        return Node(tree, self.BESTCHILD(tree, root.index, 0))
+
+    def _deadline(self, start, deadline):
+        if self._time_limit is not None:
+            if deadline is None or start + self._time_limit < deadline:
+                return start + self._time_limit
+        return deadline
+
+    def TREEPOLICY(self, tree, index, game):
+        # one walk over the at most a few siblings against a bit mask of the
+        # legal moves, instead of an index of all nodes by key
+        moves = tree.move
+        first_child = tree.first_child
+        next_sibling = tree.next_sibling
+        avails = tree.avails
+        while game.terminal() is False:
+            legal_moves = game.moves()
+            legal = 0
+            for move in legal_moves:
+                legal |= 1 << move
+            children = []
+            tried = 0
+            child = first_child[index]
+            while child != -1:
+                move = moves[child]
+                if legal >> move & 1:
+                    children.append(child)
+                    tried |= 1 << move
+                child = next_sibling[child]
+            if len(children) < len(legal_moves):
+                untried_moves = [move for move in legal_moves if not tried >> move & 1]
+                return self.EXPAND(tree, index, game, untried_moves, len(legal_moves))
+            for c in children:
+                avails[c] += 1
+            index = self.BESTCHILD(tree, index, self.SCALAR, children)
+            game.play(moves[index])
+        return index
 
-    def UCTSEARCH(self, root, observation):
-        for iter in range(int(self._budget)):
-            front = self.TREEPOLICY(root, observation)
-            reward = self.DEFAULTPOLICY(front.state)
-            self.BACKUP(front, reward)
-        return self.BESTCHILD(root, 0)
-
-    def TREEPOLICY(self, node, observation):
-        #a hack to force 'exploitation' in a game where there are many options, and you may never/not want to fully expand first
-        ob=observation
-        while node.state.terminal() is False:
-            if len(node.children) == 0:
-                return self.EXPAND(node, ob)
-            elif random.uniform(0,1) < .5: # exploitation
-                ob=None
-                node=self.BESTCHILD(node, self.SCALAR)
-            elif node.fully_expanded() is False: # exploration  
-                return self.EXPAND(node, ob)
-            else:
-                ob=None
-                node=self.BESTCHILD(node, self.SCALAR)
-        return node
-
-    def EXPAND(self, node, observation=None):
-        # find out the un-expanded state
-        tried_children=[c.state for c in node.children]
-        new_state = node.state.next_state(observation)
-        while new_state in tried_children:
-            new_state = node.state.next_state(observation)
-        node.add_child(new_state)
-        return node.children[-1]
+    def EXPAND(self, tree, index, game, untried_moves, number_of_moves):
+        move = self._random.choice(untried_moves)
+        player_id = game.player_id()
+        prior = game.prior(move, number_of_moves)
+        game.play(move)
+        key = tree.state.next_key(tree.key[index], tree.depth[index], move)
+        return tree.add(index, key, move, player_id, prior)
 
     #current this uses the most vanilla MCTS formula it is worth experimenting with THRESHOLD ASCENT (TAGS)
-    def BESTCHILD(self, node, scalar):
-        bestscore=0.0
+    def BESTCHILD(self, tree, index, scalar, children=None):
+        if children is None:
+            children = tree.children(index)
+        if len(children) == 0:
+            raise Exception("OOPS: no best child found, probably fatal")
+        # numpy only pays for its call overhead on wide nodes
+        if len(children) >= self.VECTORIZE_MIN_CHILDREN:
+            children = numpy.array(children)
+            scores = self._policy.scores(tree, children, scalar)
+            bestchildren = numpy.flatnonzero(scores == scores.max())
+            return int(children[self._random.choice(bestchildren)])
+        score = self._policy.score
+        bestscore=-math.inf
         bestchildren=[]
-        for c in node.children:
-            exploit = c.reward / c.visits
-            explore = math.sqrt(2.0*math.log(node.visits) / float(c.visits))    
-            score = exploit+scalar*explore
-            if score == bestscore:
+        for c in children:
+            s = score(tree, c, scalar)
+            if s == bestscore:
                 bestchildren.append(c)
-            if score > bestscore:
+            if s > bestscore:
                 bestchildren = [c]
-                bestscore = score
-        if len(bestchildren) == 0:
-            raise Exception("OOPS: no best child found, probably fatal")
-        return random.choice(bestchildren)
-
-    def DEFAULTPOLICY(self, state):
-        while state.terminal() is False:
-            state = state.next_state()
-        return state.reward()
-
-    def BACKUP(self, node, reward):
-        while node is not None:
-            node.visits += 1
-            node.reward += reward
-            node = node.parent
+                bestscore = s
+        return self._random.choice(bestchildren)
+
+    def DEFAULTPOLICY(self, game):
+        game.playout()
+        return game.rewards()
+
+    def BACKUP(self, tree, index, rewards):
+        visits = tree.visits
+        reward = tree.reward
+        square = tree.square
+        player_ids = tree.player_id
+        parents = tree.parent
+        while index != -1:
+            visits[index] += 1
+            player_id = player_ids[index]
+            if player_id != -1:
+                r = rewards[player_id]
+                reward[index] += r
+                square[index] += r * r
+            index = parents[index]
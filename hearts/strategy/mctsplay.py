@@ -1,225 +1,236 @@
-import math
-import copy
+import time
 import random
-import hashlib
 
-import gym
-from gymhearts import env as hearts_env
 from gymhearts import strategy
-from gymhearts.evaluator import Evaluator
 
-from treys import Deck
 from treys import Card
 
-from .completeplay import CompletePlayStrategy
+from .profiler import profiler
 from .mcts import MCTS
-from .mcts import Node
+from .mcts import TreeStore
 from .mcts import IState
+from .mcts import IGame
+from .parallelmcts import RootParallelMCTS
+from .parallelmcts import TreeParallelMCTS
+from .sampler import DealSampler
+from .simulator import HeartsSimulator
+from .endgame import EndgameSolver
+from .belief import BeliefTracker
+from .cards import ALL_CARDS_MASK
+from .cards import CARD_TO_INDEX
+from .cards import INDEX_TO_CARD
+from .cards import cards_to_mask
+
+
+# the determinized round one MCTS iteration plays in, moves are card indices
+class HeartGame(HeartsSimulator, IGame):
+
+    def __init__(self, number_of_players=4):
+        super().__init__(number_of_players)
+        self._start_scores = [0] * number_of_players
+
+    # rewards count the points taken since start_scores, the scores at
+    # the start of the round unless given otherwise
+    def reset(self, observation, hands, start_scores=None):
+        super().reset(observation, hands)
+        self._start_scores = start_scores if start_scores is not None else observation['scores']
+
+    def player_id(self):
+        return self.current_player_id
+
+    def moves(self):
+        mask = self.valid_mask()
+        moves = []
+        while mask:
+            low = mask & -mask
+            moves.append(low.bit_length() - 1)
+            mask ^= low
+        return moves
+
+    def play(self, move):
+        self.step(move)
+
+    def default_move(self):
+        return self.policy(self.valid_mask())
+
+    def terminal(self):
+        return self.done()
+
+    def rewards(self):
+        return [1.0 - (s - s0) / 26 for s, s0 in zip(self.scores, self._start_scores)]
+
+    def playout(self):
+        self.rollout()
 
 
+# Zobrist keys for the card played at each position of a round; the key of a
+# state is the xor of the keys of all cards played so far in the round.
+_zobrist_random = random.Random(0x4845415254)
+ZOBRIST_KEYS = [[_zobrist_random.getrandbits(64) for card in range(52)] for level in range(52)]
 
-class MyHeartState(IState):
 
-    def __init__(self, level, observation, info):
+# the root knows which cards are hidden and deals them for every iteration,
+# level is the number of cards played in the round, possible the cards each
+# player may hold (see belief.py)
+class HeartState(IState):
+
+    def __init__(self, level, key, game, sampler, hand_mask, hidden_mask, start_scores=None, possible=None):
         self._level = level
-        self._trick = observation['trick']
-        self._player_id = info['my_player_id']
-        self._hand_cards = info['my_hand_cards']
-        self._playing_ids = observation['playing_ids']
-        self._playing_cards = observation['playing_cards']
-        self._number_of_players = observation['number_of_players']
-        self._previous_action_card = info['previous_action_card']
-        self._previous_player_id = info['previous_player_id']
-        self._evaluator = Evaluator()
-        self._info = info
-        self._scores = observation['scores']
-        self.num_moves = len(self._valid_hand_cards)
-
-    def _get_valid_hand_cards(self, playing_cards, hand_cards):
-        valid_hand_cards = hand_cards
-        if len(playing_cards) > 0:
-            trick_suit = Card.get_suit_int(playing_cards[0])
-            valid_hand_cards = [c for c in hand_cards if Card.get_suit_int(c) == trick_suit]
-        if len(valid_hand_cards) == 0:
-            valid_hand_cards = hand_cards
-        return valid_hand_cards
-
-    def next_state(self):
-        valid_hand_cards = self._get_valid_hand_cards(self._playing_cards, self,_hand_cards)
-        my_playing_card = random.choice(valid_hand_cards)
-        self._playing_ids.append(self._player_id)
-        self._playing_cards.append(my_playing_card)
-        
-        next_observation = {}
-        next_observation['number_of_players'] = self._number_of_players
-        next_observation['scores'] = self._scores.copy()
-        next_observation['hand_cards'] = self._hand_cards.copy()
-        next_observation['hand_cards'].remove(my_playing_card)
-        if len(self._playing_ids) == 4:
-            looser_score, looser_player_id = self._evaluator.evaluate(self._playing_cards, self._playing_ids)
-            next_observation['current_player_id'] = looser_player_id
-            next_observation['playing_ids'] = []
-            next_observation['playing_cards'] = []
-            next_observation['trick'] = self._trick + 1
-            if looser_player_id == self._player_id:
-                next_observation['scores'][self._player_id] += looser_score
-        else:
-            next_observation['current_player_id'] = (self._player_id + 1) % self._number_of_players
-            next_observation['playing_ids'] = self._playing_ids.copy()
-            next_observation['playing_cards'] = self._playing_cards.copy()
-            next_observation['trick'] = self._trick
-        next_info = copy.depcopy(self._info)
-        next_info['previous_action_card'] = my_playing_card
-        next_info['previous_player_id'] = self._player_id
-        return PlayerHeartState(self._level + 1, next_observation, next_info)
-
-    def get_action_card(self):
-        return self._previous_action_card
-
-    def reward(self):
-        r = 1.0 - self._scores[self._player_id] / 26
-        return r
-
-    def __hash__(self):
-        hash_str = "{}:{}:{}:{}:{}".format(
-            str(self._level),
-            str(self._player_id),
-            str(self._valid_hand_cards),
-            str(self._playing_cards),
-            str(self._playing_ids),
-        ).encode('utf-8')
-        return int(hashlib.md5(hash_str).hexdigest(), 16)
-
-    def __eq__(self,other):
-        if hash(self) == hash(other):
-            return True
-        return False
-    
-
-
-
-class PlayerHeartState(IState):
-
-    def __init__(self, level, observation, info):
-        self._level = level + 1
-        self._trick = observation['trick']
-        self._player_id = observation['current_player_id']
-        self._available_cards = info['available_cards']
-        self._playing_ids = observation['playing_ids']
-        self._playing_cards = observation['playing_cards']
-        self._previous_action_card = info['previous_action_card']
-        self._previous_player_id = info['previous_player_id']
-        self._evaluator = Evaluator()
-        self._scores = observation['scores']
-
-    def next_state(self):
-        competitor_playing_card = random.choice(self._available_cards)
-        self._playing_ids.append(self._player_id)
-        self._playing_cards.append(my_playing_card)
-        
-        next_observation = {}
-        next_observation['number_of_players'] = self._number_of_players
-        next_observation['scores'] = self._scores.copy()
-        if len(self._playing_ids) == 4:
-            looser_score, looser_player_id = self._evaluator.evaluate(self._playing_cards, self._playing_ids)
-            next_observation['current_player_id'] = looser_player_id
-            next_observation['playing_ids'] = []
-            next_observation['playing_cards'] = []
-            next_observation['trick'] = self._trick + 1
-            if looser_player_id == self._player_id:
-                next_observation['scores'][self._player_id] += looser_score
-        else:
-            next_observation['current_player_id'] = (self._player_id + 1) % self._number_of_players
-            next_observation['playing_ids'] = self._playing_ids.copy()
-            next_observation['playing_cards'] = self._playing_cards.copy()
-            next_observation['trick'] = self._trick
-        next_info = copy.depcopy(self._info)
-        next_info['previous_action_card'] = competitor_playing_card
-        next_info['previous_player_id'] = self._player_id
-        next_info['available_cards'].remove(my_playing_card)
-        if next_observation['current_player_id'] == next_info['my_player_id']:
-            return MyHeartState(self._level + 1, next_observation, next_info)
-        else:
-            return PlayerHeartState(self._level + 1, next_observation, next_info)
+        self.key = key
+        self._game = game
+        self._sampler = sampler
+        self._hand_mask = hand_mask
+        self._hidden_mask = hidden_mask
+        self._start_scores = start_scores
+        self._possible = possible
+        self._sampler.reset(hidden_mask, possible)
+
+    def next_key(self, key, depth, move):
+        return key ^ ZOBRIST_KEYS[self._level + depth][move]
+
+    def determinize(self, observation):
+        current_player_id = observation['current_player_id']
+        hands = self._sampler.deal(observation['number_of_hand_cards_for_all_players'], current_player_id)
+        hands[current_player_id] = self._hand_mask
+        self._game.reset(observation, hands, self._start_scores)
+        return self._game
+
+    def fork(self, seed):
+        return HeartState(
+            self._level, self.key, HeartGame(), DealSampler(seed), self._hand_mask, self._hidden_mask,
+            self._start_scores, self._possible,
+        )
 
-    def terminal(self):
-        return self._level >= 53
-    
-    def reward(self):
-        r = 1.0 - self._scores[next_info['my_player_id']] / 26
-        return r
- 
-    def __hash__(self):
-        hash_str = "{}:{}:{}:{}:{}".format(
-            str(self._level),
-            str(self._player_id),
-            str(self._available_cards),
-            str(self._playing_cards),
-            str(self._playing_ids),
-        ).encode('utf-8')
-        return int(hashlib.md5(hash_str).hexdigest(), 16)
-    
-
-    def __eq__(self,other):
-        if hash(self) == hash(other):
-            return True
-        return False
-    
 
 class MCTSPlayStrategy(strategy.IStrategy):
-    
-    def __init__(self, budget, my_player_id):
+
+    # budget is the most iterations per move and time_limit the seconds per move,
+    # policy is the mcts selection policy (UCB1 by default),
+    # parallel is None, 'root' (worker processes) or 'tree' (threads) with workers of them,
+    # reuse_tree keeps the subtree under the observed plays for the next move,
+    # from endgame_cards cards left in hand every card is solved exactly on
+    # endgame_samples deals instead of searched, 0 turns the solver off,
+    # with beliefs the deals keep to the suits the others have shown to be out of
+    def __init__(
+        self, budget, my_player_id, time_limit=None, seed=None, policy=None, parallel=None, workers=2,
+        reuse_tree=True, endgame_cards=3, endgame_samples=16, beliefs=True,
+    ):
         self._my_player_id = my_player_id
-        self._evaluator = Evaluator()
-        self._mcts = MCTS(budget)
-        self._current_node = None
-
-    def move(self, observation):
-        if self._current_node is None:
-            new_mcts_info = {}
-            new_mcts_info['my_player_id'] = self._my_player_id
-            new_mcts_info['my_hand_cards'] = observation['hand_cards'].copy()
-            deck = Deck()
-            new_mcts_info['available_cards'] = deck.draw(52)
-            for c in new_mcts_info['my_hand_cards']:
-                new_mcts_info['available_cards'].remove(c)
-            self._current_node = Node(MyHeartState(0, observation, new_mcts_info))
-            if len(observation['playing_ids']) == 0:
-                return Card.new('2c')
-        best_next_node = self._mcts.UCTSEARCH(self._current_node, observation)
-        return best_next_node.state.get_action_card()
+        if parallel == 'root':
+            self._mcts = RootParallelMCTS(budget, time_limit, seed, policy, workers=workers)
+        elif parallel == 'tree':
+            self._mcts = TreeParallelMCTS(budget, time_limit, seed, policy, threads=workers)
+        else:
+            self._mcts = MCTS(budget, time_limit, seed, policy)
+        self._sampler = DealSampler(seed)
+        self._game = HeartGame()
+        self._available_mask = ALL_CARDS_MASK
+        self._level = 0
+        self._key = 0
+        self._start_scores = [0] * 4
+        self._reuse_tree = reuse_tree
+        self._tree = None
+        self._tree_index = 0
+        self._reused_visits = 0
+        self._endgame_cards = endgame_cards
+        self._endgame_samples = endgame_samples
+        self._solver = EndgameSolver()
+        self._belief = BeliefTracker() if beliefs else None
+        self._iterations = 0
+        self._elapsed = 0.0
+        self.last_iterations = 0
+
+    # deadline is a time.perf_counter() value to stop searching at, on top of
+    # time_limit; last_iterations is the iterations or endgame deals of the move
+    def move(self, observation, deadline=None):
+        self.last_iterations = 0
+        valid_hand_cards = observation['valid_hand_cards']
+        if len(valid_hand_cards) == 1:
+            return valid_hand_cards[0]
+        hand_mask = cards_to_mask(observation['hand_cards'])
+        hidden_mask = self._available_mask & ~hand_mask
+        possible = self._belief.possible(hidden_mask) if self._belief is not None else None
+        root_state = HeartState(
+            self._level, self._key, self._game, self._sampler, hand_mask, hidden_mask, self._start_scores, possible
+        )
+        if observation['trick'] > 0 and len(observation['hand_cards']) <= self._endgame_cards:
+            self._tree = None
+            return INDEX_TO_CARD[self._solve_endgame(root_state, observation, deadline)]
+        if self._tree is not None:
+            # the statistics below the observed plays stay valid, the rest is freed
+            self._tree = self._tree.subtree(self._tree_index, root_state)
+            self._reused_visits += self._tree.visits[0]
+            if profiler.enabled:
+                profiler.add('mcts.reused_visits', self._tree.visits[0])
+        else:
+            self._tree = TreeStore(root_state)
+        self._tree_index = 0
+        root = self._tree.root()
+        best_next_node = self._mcts.UCTSEARCH(root, observation, deadline)
+        if not self._reuse_tree:
+            self._tree = None
+        self.last_iterations = self._mcts.iterations
+        self._iterations += self._mcts.iterations
+        self._elapsed += self._mcts.elapsed
+        return INDEX_TO_CARD[best_next_node.move]
+
+    def _solve_endgame(self, root_state, observation, deadline=None):
+        # the card with the fewest points over deals solved with open hands
+        player_id = observation['current_player_id']
+        totals = {}
+        for _ in range(self._endgame_samples):
+            if deadline is not None and self.last_iterations > 0 and time.perf_counter() >= deadline:
+                break
+            self.last_iterations += 1
+            game = root_state.determinize(observation)
+            for move in game.moves():
+                totals[move] = totals.get(move, 0) + self._solver.solve(game, player_id, move)
+        return min(totals, key=totals.get)
+
+    def endgame_nodes_per_second(self):
+        return self._solver.nodes_per_second()
+
+    def close(self):
+        if isinstance(self._mcts, RootParallelMCTS):
+            self._mcts.close()
+
+    def reused_visits(self):
+        # visits carried over from earlier moves into the searches
+        return self._reused_visits
+
+    def iterations_per_second(self):
+        if self._elapsed == 0.0:
+            return 0.0
+        return self._iterations / self._elapsed
+
+    def _new_round(self, scores):
+        self._available_mask = ALL_CARDS_MASK
+        self._level = 0
+        self._key = 0
+        self._start_scores = scores
+        self._tree = None
 
     def _show_cards(self, hand_cards):
-        suitrank_ints = [c & 0xFF00 for c in hand_cards] 
+        suitrank_ints = [c & 0xFF00 for c in hand_cards]
         sorted_indices = sorted(range(len(suitrank_ints)), key=lambda k: suitrank_ints[k])
         sorted_cards = [hand_cards[ind] for ind in sorted_indices]
         qq = [Card.int_to_pretty_str(c) for c in sorted_cards]
         print(' '.join(qq))
 
     def watch(self, observation, info):
+        if self._belief is not None:
+            self._belief.watch(observation, info)
         if info['done'] is True:
-            pass
+            # the next move is in a new game
+            self._new_round([0] * 4)
         elif info['is_new_round'] is True:
-            self._current_node = None
-        elif info['current_player_id'] == self._my_player_id:
-            my_played_card = observation['playing_cards'][observation['playing_ids'].index(self._my_player_id)]
-            my_played_reward = 0
-            if info['punish_player_id'] == self._my_player_id:
-                my_played_reward = info['punish_score']
-            current_mcts_info = self._current_node.state.get_mcts_info()
-            new_available_cards = current_mcts_info['available_cards'].copy()
-            for c in observation['playing_cards']:
-                if c in new_available_cards:
-                    new_available_cards.remove(c)
-            new_mcts_info['available_cards'] = new_available_cards
-            new_mcts_info['my_player_id'] = self._my_player_id
-            new_mcts_info['my_played_card'] = my_played_card
-            new_mcts_info['my_played_reward'] = my_played_reward
-            new_mcts_info['my_hand_cards'] = current_mcts_info['my_hand_cards'].copy()
-            if my_played_card in new_mcts_info['my_hand_cards']:
-                new_mcts_info['my_hand_cards'].remove(my_played_card)
-            new_mcts_info['punish_player_id'] = info['punish_player_id']
-            next_state = HeartState(observation, new_mcts_info)
-            self._current_node = self._current_node.move_to_child(next_state)
-
-
+            self._new_round(list(observation['scores']))
+        else:
+            played_card = CARD_TO_INDEX[info['action']]
+            if self._tree is not None:
+                self._tree_index = self._tree.find_child(self._tree_index, played_card)
+                if self._tree_index == -1:
+                    self._tree = None
+            self._available_mask &= ~(1 << played_card)
+            self._key ^= ZOBRIST_KEYS[self._level][played_card]
+            self._level += 1
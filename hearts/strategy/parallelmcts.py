@@ -0,0 +1,150 @@
+import math
+import time
+import threading
+import concurrent.futures
+
+from .mcts import MCTS
+from .mcts import Node
+from .mcts import TreeStore
+
+
+# Parallel versions of MCTS.UCTSEARCH, both are drop-ins for MCTS:
+# search = RootParallelMCTS(budget, workers=4); best = search.UCTSEARCH(root, observation)
+#
+# The root state has to implement IState.fork(seed), which returns an
+# independent copy of the state with its own random stream.
+
+
+def _search_in_worker(state, observation, budget, time_limit, seed, policy):
+    # one independent tree, only the statistics of the root children go back
+    mcts = MCTS(budget, time_limit, seed, policy)
+    tree = TreeStore(state)
+    mcts.UCTSEARCH(tree.root(), observation)
+    stats = []
+    for child in tree.children(0):
+        stats.append((
+            tree.move[child], tree.player_id[child], tree.prior[child], tree.visits[child],
+            tree.avails[child], tree.reward[child], tree.square[child],
+        ))
+    return mcts.iterations, stats
+
+
+# Root parallelism: every worker process grows its own tree from the root
+# with its own seed and share of the budget, then the statistics of the root
+# children are summed by move into the caller's tree before picking the best.
+class RootParallelMCTS(MCTS):
+
+    # the process pool is kept alive across searches, pass executor to share
+    # one pool between players
+    def __init__(self, budget, time_limit=None, seed=None, policy=None, workers=2, executor=None):
+        super().__init__(budget, time_limit, seed, policy)
+        self._workers = workers
+        self._executor = executor
+        self._owns_executor = executor is None
+
+    def close(self):
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def UCTSEARCH(self, root, observation, deadline=None):
+        tree = root.tree
+        start = time.perf_counter()
+        # workers get the time that is left, clocks are not shared between processes
+        deadline = self._deadline(start, deadline)
+        time_limit = None
+        if deadline is not None:
+            time_limit = max(0.0, deadline - start)
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self._workers)
+        budget = int(math.ceil(self._budget / self._workers))
+        futures = [
+            self._executor.submit(
+                _search_in_worker, tree.state.fork(self._random.getrandbits(64)), observation, budget,
+                time_limit, self._random.getrandbits(64), self._policy,
+            )
+            for _ in range(self._workers)
+        ]
+        iterations = 0
+        for future in futures:
+            worker_iterations, stats = future.result()
+            iterations += worker_iterations
+            self._merge(tree, root.index, stats)
+        self.iterations = iterations
+        self.elapsed = time.perf_counter() - start
+        return Node(tree, self.BESTCHILD(tree, root.index, 0))
+
+    def _merge(self, tree, index, stats):
+        for move, player_id, prior, visits, avails, reward, square in stats:
+            child = tree.find_child(index, move)
+            if child == -1:
+                key = tree.state.next_key(tree.key[index], tree.depth[index], move)
+                child = tree.add(index, key, move, player_id, prior)
+                # add() counts one visit for the new node, the worker did too
+                tree.visits[child] = 0
+                tree.avails[child] = 0
+            tree.visits[child] += visits
+            tree.avails[child] += avails
+            tree.reward[child] += reward
+            tree.square[child] += square
+        tree.visits[index] += sum(s[3] for s in stats)
+
+
+# Tree parallelism: threads share one tree. Selection, expansion and backup
+# hold a lock, the playouts run outside of it. Every node on the path of a
+# running iteration gets virtual_loss extra visits without reward until its
+# backup, which steers the other threads to different paths.
+#
+# Playouts are pure python, so with the GIL the threads take turns; this
+# only pays off where playouts release the GIL or on a free-threaded build.
+class TreeParallelMCTS(MCTS):
+
+    def __init__(self, budget, time_limit=None, seed=None, policy=None, threads=2, virtual_loss=1):
+        super().__init__(budget, time_limit, seed, policy)
+        self._threads = threads
+        self._virtual_loss = virtual_loss
+
+    def UCTSEARCH(self, root, observation, deadline=None):
+        tree = root.tree
+        start = time.perf_counter()
+        deadline = self._deadline(start, deadline)
+        self._lock = threading.Lock()
+        self._started = 0
+        self._finished = 0
+        states = [tree.state.fork(self._random.getrandbits(64)) for _ in range(self._threads)]
+        threads = [
+            threading.Thread(target=self._search, args=(tree, root.index, state, observation, deadline))
+            for state in states
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.iterations = self._finished
+        self.elapsed = time.perf_counter() - start
+        return Node(tree, self.BESTCHILD(tree, root.index, 0))
+
+    def _search(self, tree, index, state, observation, deadline):
+        lock = self._lock
+        while True:
+            with lock:
+                if self._started >= self._budget:
+                    break
+                if deadline is not None and time.perf_counter() >= deadline:
+                    break
+                self._started += 1
+                game = state.determinize(observation)
+                front = self.TREEPOLICY(tree, index, game)
+                self._add_virtual_loss(tree, front, self._virtual_loss)
+            rewards = self.DEFAULTPOLICY(game)
+            with lock:
+                self._add_virtual_loss(tree, front, -self._virtual_loss)
+                self.BACKUP(tree, front, rewards)
+                self._finished += 1
+
+    def _add_virtual_loss(self, tree, index, loss):
+        visits = tree.visits
+        parents = tree.parent
+        while index != -1:
+            visits[index] += loss
+            index = parents[index]
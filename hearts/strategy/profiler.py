@@ -0,0 +1,125 @@
+import os
+import json
+
+
+# Per move and per game profiling of the hot paths, off by default. Code that
+# is profiled checks profiler.enabled once per search, rollout batch or solve
+# and only then takes the timed path, so a disabled profiler costs next to
+# nothing. Names ending in .seconds are times, names ending in .max keep the
+# largest value, all others are summed counts.
+#
+# A profiled move runs from begin_move to end_move. What is added outside of
+# profiled moves, by the env or by players that are not profiled, is kept
+# apart and recorded as kind 'env' before the next profiled move starts.
+#
+#   from utils.logger import profiler, ProfiledStrategy
+#   profiler.enable()
+#   env.add_player(ProfiledStrategy(MCTSPlayStrategy(...), 'mcts'))
+#   ... play ...
+#   print(profiler.summary())
+#   profiler.export('profile.jsonl')
+#
+# Work done in process pool workers is not seen by the profiler of the parent.
+# HEARTS_PROFILE=1 in the environment enables the profiler on import.
+class Profiler(object):
+
+    def __init__(self):
+        self.enabled = False
+        self.records = []
+        self._move = {}
+        self._env = {}
+        self._in_move = False
+        self._games = {}
+        self._number_of_games = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        self.records = []
+        self._move = {}
+        self._env = {}
+        self._in_move = False
+        self._games = {}
+        self._number_of_games = {}
+
+    def add(self, name, value=1):
+        counts = self._move if self._in_move else self._env
+        counts[name] = counts.get(name, 0) + value
+
+    def peak(self, name, value):
+        counts = self._move if self._in_move else self._env
+        if value > counts.get(name, value - 1):
+            counts[name] = value
+
+    def begin_move(self):
+        self._end_env()
+        self._in_move = True
+
+    def end_move(self, player, seconds):
+        # close the move in progress, everything added since begin_move is
+        # counted to it
+        self._move['move.seconds'] = self._move.get('move.seconds', 0) + seconds
+        record = {'kind': 'move', 'player': player, 'game': self._number_of_games.get(player, 0)}
+        record.update(self._move)
+        self.records.append(record)
+        _merge(self._games.setdefault(player, {}), self._move)
+        self._move = {}
+        self._in_move = False
+
+    def _end_env(self):
+        if self._env:
+            record = {'kind': 'env', 'player': 'env'}
+            record.update(self._env)
+            self.records.append(record)
+            self._env = {}
+
+    def end_game(self, player):
+        self._end_env()
+        record = {'kind': 'game', 'player': player, 'game': self._number_of_games.get(player, 0)}
+        record.update(self._games.pop(player, {}))
+        self.records.append(record)
+        self._number_of_games[player] = record['game'] + 1
+
+    def export(self, path):
+        # one JSON object per line, moves and games in the order they ended
+        self._end_env()
+        with open(path, 'w') as f:
+            for record in self.records:
+                f.write(json.dumps(record, sort_keys=True) + '\n')
+
+    def summary(self):
+        # total, mean and largest value per move of every metric of every
+        # player, env work between profiled moves counts as moves of env
+        self._end_env()
+        moves = {}
+        for record in self.records:
+            if record['kind'] in ('move', 'env'):
+                moves.setdefault(record['player'], []).append(record)
+        lines = ["{:<12} {:<32} {:>14} {:>14} {:>14}".format('player', 'metric', 'total', 'per move', 'max')]
+        for player, records in sorted(moves.items()):
+            names = sorted(set(k for r in records for k in r if k not in ('kind', 'player', 'game')))
+            for name in names:
+                values = [r.get(name, 0) for r in records]
+                total = max(values) if name.endswith('.max') else sum(values)
+                lines.append("{:<12} {:<32} {:>14.6g} {:>14.6g} {:>14.6g}".format(
+                    player, name, total, sum(values) / len(values), max(values)
+                ))
+            lines.append("{:<12} {:<32} {:>14}".format(player, 'moves', len(records)))
+        return '\n'.join(lines)
+
+
+def _merge(totals, values):
+    for name, value in values.items():
+        if name.endswith('.max'):
+            totals[name] = max(totals.get(name, value), value)
+        else:
+            totals[name] = totals.get(name, 0) + value
+
+
+profiler = Profiler()
+if os.environ.get('HEARTS_PROFILE', '') not in ('', '0'):
+    profiler.enable()
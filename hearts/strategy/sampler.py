@@ -0,0 +1,158 @@
+import random
+
+
+# Deal hidden cards without touching shared state. Every sampler owns its random
+# generator and a preallocated array of card indices (see cards.py), so one
+# sampler per player or thread is enough to deal concurrently.
+#
+# possible, when given to reset, is a mask per player of the cards that player
+# may hold (see belief.py) and deals only give players cards they may hold.
+class DealSampler(object):
+
+    def __init__(self, seed=None):
+        self._random = random.Random(seed)
+        self._cards = [0] * 52
+        self._number_of_cards = 0
+        self._possible = None
+        self._plan = None
+
+    def seed(self, seed):
+        self._random.seed(seed)
+
+    def reset(self, mask, possible=None):
+        # load the cards of mask into the array
+        self._possible = None
+        self._plan = None
+        if possible is not None and any(mask & ~p for p in possible):
+            self._possible = list(possible)
+        cards = self._cards
+        n = 0
+        while mask:
+            low = mask & -mask
+            cards[n] = low.bit_length() - 1
+            n += 1
+            mask ^= low
+        self._number_of_cards = n
+
+    def deal(self, counts, skip_player_id=None):
+        if self._possible is not None:
+            hands = self._deal_constrained(counts, skip_player_id)
+            if hands is not None:
+                return hands
+        return self._deal(counts, skip_player_id)
+
+    def _make_plan(self, skip_player_id):
+        # split the cards into the ones every dealt player may hold and the
+        # constrained ones, most constrained first. Players are numbered by
+        # their position in player_ids and a set of players is a bit mask of
+        # positions; need[S] counts the cards only the players in S may hold.
+        player_ids = [i for i in range(len(self._possible)) if i != skip_player_id]
+        number_of_sets = 1 << len(player_ids)
+        constrained = []
+        free = []
+        need = [0] * number_of_sets
+        for i in range(self._number_of_cards):
+            card = self._cards[i]
+            candidates = 0
+            for position, player_id in enumerate(player_ids):
+                if (self._possible[player_id] >> card) & 1:
+                    candidates |= 1 << position
+            for players in range(number_of_sets):
+                if candidates & players == candidates:
+                    need[players] += 1
+            if candidates == number_of_sets - 1:
+                free.append(card)
+            else:
+                constrained.append((bin(candidates).count('1'), card, candidates))
+        constrained.sort()
+        # giving a card of candidates to position takes room from every set
+        # with position in it, the sets holding all candidates lose the need
+        # of the card too; only the others can run out of room
+        options = {}
+        for i, (_, card, candidates) in enumerate(constrained):
+            if candidates not in options:
+                options[candidates] = [
+                    (position, [
+                        players for players in range(number_of_sets)
+                        if (players >> position) & 1 and candidates & players != candidates
+                    ])
+                    for position in range(len(player_ids)) if (candidates >> position) & 1
+                ]
+            constrained[i] = (card, options[candidates])
+        self._plan = (skip_player_id, player_ids, constrained, free, need)
+
+    def _deal_constrained(self, counts, skip_player_id):
+        # every constrained card goes to one of its players, picked in
+        # proportion to the cards they still take among the players that keep
+        # the rest of the deal possible (Hall's condition: the cards only the
+        # players of a set may hold fit in the room those players have left).
+        # The free cards are shuffled into what is left. None if the beliefs
+        # allow no deal at all.
+        if self._plan is None or self._plan[0] != skip_player_id:
+            self._make_plan(skip_player_id)
+        _, player_ids, constrained, free, need = self._plan
+        left = [counts[player_id] for player_id in player_ids]
+        room = []
+        for players in range(len(need)):
+            total = 0
+            for position in range(len(player_ids)):
+                if (players >> position) & 1:
+                    total += left[position]
+            room.append(total - need[players])
+        if min(room) < 0:
+            return None
+        uniform = self._random.random
+        hands = [0] * len(counts)
+        weights = [0] * len(player_ids)
+        for card, options in constrained:
+            total = 0
+            for position, tight in options:
+                weight = left[position]
+                for players in tight:
+                    if room[players] < 1:
+                        weight = 0
+                        break
+                weights[position] = weight
+                total += weight
+            pick = uniform() * total
+            for position, tight in options:
+                pick -= weights[position]
+                if pick < 0:
+                    break
+            for players in tight:
+                room[players] -= 1
+            hands[player_ids[position]] |= 1 << card
+            left[position] -= 1
+        n = len(free)
+        for i in range(n):
+            j = i + int(uniform() * (n - i))
+            free[i], free[j] = free[j], free[i]
+        start = 0
+        for position, player_id in enumerate(player_ids):
+            hand = hands[player_id]
+            for i in range(start, start + left[position]):
+                hand |= 1 << free[i]
+            hands[player_id] = hand
+            start += left[position]
+        return hands
+
+    def _deal(self, counts, skip_player_id=None):
+        # partial Fisher-Yates shuffle: only the cards for all but the last
+        # dealt player are drawn, whatever is left goes to the last player
+        cards = self._cards
+        n = self._number_of_cards
+        uniform = self._random.random
+        player_ids = [i for i in range(len(counts)) if i != skip_player_id]
+        shuffled = n - counts[player_ids[-1]]
+        for i in range(shuffled):
+            j = i + int(uniform() * (n - i))
+            cards[i], cards[j] = cards[j], cards[i]
+        hands = [0] * len(counts)
+        start = 0
+        for player_id in player_ids:
+            hand = 0
+            for i in range(start, start + counts[player_id]):
+                hand |= 1 << cards[i]
+            hands[player_id] = hand
+            start += counts[player_id]
+        return hands
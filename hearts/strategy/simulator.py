@@ -0,0 +1,189 @@
+from .cards import CARD_TO_INDEX
+from .cards import RANK_MASK
+from .cards import SUIT_MASKS
+from .cards import HEARTS_MASK
+from .cards import SPADES_QUEEN_BIT
+from .cards import CLUB_TWO_BIT
+from .cards import PENALTIES
+from .cards import cards_to_mask
+from .cards import penalty
+from .cards import max_card
+from .cards import min_card
+
+
+# Play out a hearts round on bitmasks, following the same rules as
+# gymhearts.env.HeartsEnv.step and scoring tricks like Evaluator.evaluate.
+# The default policy is the bitmask version of CompletePlayStrategy; it picks
+# the same card as CompletePlayStrategy whenever hands are kept in index order.
+class HeartsSimulator(object):
+
+    def __init__(self, number_of_players=4):
+        self._number_of_players = number_of_players
+        self._number_of_tricks = 52 // number_of_players
+        self.hands = [0] * number_of_players
+        self.scores = [0] * number_of_players
+        self.trick = 0
+        self.current_player_id = 0
+        self.playing_cards = []
+        self.playing_ids = []
+        self._trick_mask = 0
+        self._lead_suit = -1
+        self._first_valid_mask = 0
+
+    def reset(self, observation, hands):
+        self.hands = list(hands)
+        self.scores = list(observation['scores'])
+        self.trick = observation['trick']
+        self.current_player_id = observation['current_player_id']
+        self.playing_cards = [CARD_TO_INDEX[c] for c in observation['playing_cards']]
+        self.playing_ids = list(observation['playing_ids'])
+        self._lead_suit = -1
+        # the env only clears a finished trick on the next step
+        if len(self.playing_cards) == self._number_of_players:
+            self._lead_suit = self.playing_cards[0] // 13
+            self.playing_cards = []
+            self.playing_ids = []
+        self._trick_mask = 0
+        for c in self.playing_cards:
+            self._trick_mask |= 1 << c
+        # the suit a new leader is held to is not part of the observation,
+        # so the first move is checked against what the env offered
+        self._first_valid_mask = cards_to_mask(observation['valid_hand_cards'])
+
+    def done(self):
+        return self.trick == self._number_of_tricks
+
+    def valid_mask(self):
+        if self._first_valid_mask:
+            return self._first_valid_mask
+        hand = self.hands[self.current_player_id]
+        if len(self.playing_cards) > 0:
+            suit = self.playing_cards[0] // 13
+        elif self.trick == 0:
+            return CLUB_TWO_BIT
+        else:
+            # HeartsEnv builds the leader's observation before it clears the
+            # finished trick, so the leader has to follow the previous lead suit
+            suit = self._lead_suit
+        valid = hand & SUIT_MASKS[suit]
+        if valid == 0:
+            valid = hand
+        if self.trick == 0:
+            # HeartsEnv would hand out no valid card here, keep the hand instead
+            valid = (valid & ~(HEARTS_MASK | SPADES_QUEEN_BIT)) or valid
+        return valid
+
+    def step(self, card):
+        self._first_valid_mask = 0
+        player_id = self.current_player_id
+        bit = 1 << card
+        self.hands[player_id] &= ~bit
+        self._trick_mask |= bit
+        self.playing_cards.append(card)
+        self.playing_ids.append(player_id)
+        if len(self.playing_cards) < self._number_of_players:
+            self.current_player_id = (player_id + 1) % self._number_of_players
+            return None
+        punish_score, punish_player_id = self.evaluate()
+        self.scores[punish_player_id] += punish_score
+        self.trick += 1
+        self._lead_suit = self.playing_cards[0] // 13
+        self.playing_cards = []
+        self.playing_ids = []
+        self._trick_mask = 0
+        self.current_player_id = punish_player_id
+        return punish_score, punish_player_id
+
+    def evaluate(self):
+        lead_cards = self._trick_mask & SUIT_MASKS[self.playing_cards[0] // 13]
+        looser_card = lead_cards.bit_length() - 1
+        looser_player_id = self.playing_ids[self.playing_cards.index(looser_card)]
+        return penalty(self._trick_mask), looser_player_id
+
+    def policy(self, valid):
+        if len(self.playing_cards) == self._number_of_players - 1:
+            first_suit_mask = SUIT_MASKS[self.playing_cards[0] // 13]
+            # we do not have same suit card or nothing to loose, so just drop max card.
+            if (valid & first_suit_mask) == 0 or penalty(self._trick_mask) == 0:
+                return max_card(valid)
+            competitor_card = (self._trick_mask & first_suit_mask).bit_length() - 1
+            safe_cards = valid & ((1 << competitor_card) - 1)
+            # we will be the looser in this round, so just drop max card.
+            if safe_cards == 0:
+                return max_card(valid)
+            # drop the card which is not larger then biggest playing card.
+            return safe_cards.bit_length() - 1
+        return min_card(valid)
+
+    def rollout(self, first_card=None):
+        if first_card is None and self._first_valid_mask:
+            first_card = self.policy(self._first_valid_mask)
+        if first_card is not None:
+            self.step(first_card)
+        # same as calling step(policy(valid_mask())) until the round ends,
+        # inlined because this loop is where look-ahead spends its time
+        number_of_players = self._number_of_players
+        last_position = number_of_players - 1
+        number_of_tricks = self._number_of_tricks
+        hands = self.hands
+        scores = self.scores
+        trick = self.trick
+        player_id = self.current_player_id
+        playing_cards = self.playing_cards
+        playing_ids = self.playing_ids
+        trick_mask = self._trick_mask
+        trick_points = penalty(trick_mask)
+        lead_suit = self._lead_suit
+        while trick < number_of_tricks:
+            hand = hands[player_id]
+            position = len(playing_cards)
+            if position > 0:
+                first_suit_mask = SUIT_MASKS[playing_cards[0] // 13]
+            elif trick == 0:
+                first_suit_mask = CLUB_TWO_BIT
+            else:
+                first_suit_mask = SUIT_MASKS[lead_suit]
+            valid = hand & first_suit_mask
+            if valid == 0:
+                valid = hand
+            if trick == 0:
+                valid = (valid & ~(HEARTS_MASK | SPADES_QUEEN_BIT)) or valid
+            if position == last_position and (valid & first_suit_mask) and trick_points > 0:
+                competitor_card = (trick_mask & first_suit_mask).bit_length() - 1
+                card = valid & ((1 << competitor_card) - 1)
+                if card == 0:
+                    card = max_card(valid)
+                else:
+                    card = card.bit_length() - 1
+            elif position == last_position:
+                card = max_card(valid)
+            else:
+                ranks = (valid | (valid >> 13) | (valid >> 26) | (valid >> 39)) & RANK_MASK
+                bit = ranks & -ranks
+                while not (valid & bit):
+                    bit <<= 13
+                card = bit.bit_length() - 1
+            bit = 1 << card
+            hands[player_id] = hand & ~bit
+            trick_mask |= bit
+            trick_points += PENALTIES[card]
+            playing_cards.append(card)
+            playing_ids.append(player_id)
+            if position < last_position:
+                player_id = player_id + 1 if player_id < last_position else 0
+                continue
+            lead_suit = playing_cards[0] // 13
+            looser_card = (trick_mask & SUIT_MASKS[lead_suit]).bit_length() - 1
+            player_id = playing_ids[playing_cards.index(looser_card)]
+            scores[player_id] += trick_points
+            trick += 1
+            playing_cards.clear()
+            playing_ids.clear()
+            trick_mask = 0
+            trick_points = 0
+        self.trick = trick
+        self.current_player_id = player_id
+        self._trick_mask = trick_mask
+        self._lead_suit = lead_suit
+        return scores
+
@@ -0,0 +1,95 @@
+import time
+
+import numpy
+
+from utils import logger
+from utils.seededenv import SeededHeartsEnv
+from utils.batchenv import BatchHeartsEnv
+from strategy.firstplay import FirstPlayStrategy
+from strategy.lowplay import LowPlayStrategy
+from strategy.completeplay import CompletePlayStrategy
+from strategy.batchplay import BatchFirstPlayStrategy
+from strategy.batchplay import BatchLowPlayStrategy
+from strategy.batchplay import BatchCompletePlayStrategy
+from strategy.cards import CARD_TO_INDEX
+from strategy.cards import cards_to_mask
+
+
+# play the same seeded games in SeededHeartsEnv one at a time and all at once
+# in BatchHeartsEnv, and check that every rule strategy sees the same valid
+# cards and plays the same card at every step, and that the scores match.
+def play_single(seed, strategy):
+    env = SeededHeartsEnv(seed=seed, sort_hands=True)
+    for _ in range(4):
+        env.add_player(strategy())
+    env.start()
+    observation = env.get_observation()
+    steps = []
+    done = False
+    while not done:
+        valid_mask = cards_to_mask(observation['valid_hand_cards'])
+        action = env.move()
+        player_id = observation['current_player_id']
+        observation, reward, done, info = env.step(action)
+        steps.append((player_id, valid_mask, CARD_TO_INDEX[action], info.get('punish_player_id', -1)))
+    return steps, observation['scores']
+
+
+def play_batch(seeds, strategy):
+    env = BatchHeartsEnv(seeds=seeds)
+    batch_strategy = strategy()
+    for _ in range(4):
+        env.add_player(batch_strategy)
+    env.start()
+    observation = env.get_observation()
+    steps = [[] for _ in seeds]
+    scores = [None] * len(seeds)
+    while not all(observation['done']):
+        actions = env.move(observation)
+        next_observation, rewards, done, info = env.step(actions)
+        for game in numpy.flatnonzero(~observation['done']):
+            steps[game].append((
+                int(observation['current_player_id'][game]), int(observation['valid_hand_cards'][game]),
+                int(actions[game]), int(info['punish_player_id'][game]),
+            ))
+            if done[game]:
+                scores[game] = list(info['final_scores'][game])
+                assert scores[game] == list(next_observation['scores'][game])
+        observation = next_observation
+    return steps, scores
+
+
+number_of_games = 16
+seeds = list(range(number_of_games))
+for single, batch in (
+    (FirstPlayStrategy, BatchFirstPlayStrategy),
+    (LowPlayStrategy, BatchLowPlayStrategy),
+    (CompletePlayStrategy, BatchCompletePlayStrategy),
+):
+    batch_steps, batch_scores = play_batch(seeds, batch)
+    for seed in seeds:
+        steps, scores = play_single(seed, single)
+        assert batch_steps[seed] == steps, (single.__name__, seed)
+        assert batch_scores[seed] == scores, (single.__name__, seed)
+    print("{} games of {} match HeartsEnv".format(number_of_games, batch.__name__))
+
+# with auto_reset games start again as soon as they are done
+env = BatchHeartsEnv(256, seed=0, auto_reset=True)
+strategy = BatchCompletePlayStrategy()
+for _ in range(4):
+    env.add_player(strategy)
+env.start()
+observation = env.get_observation()
+number_of_done = 0
+number_of_moves = 0
+start = time.perf_counter()
+for _ in range(52 * 20):
+    observation, rewards, done, info = env.step(env.move(observation))
+    assert not any(observation['done'])
+    assert all(numpy.any(info['final_scores'][done] >= 100, axis=1))
+    assert all(numpy.sum(info['final_scores'][done], axis=1) % 26 == 0)
+    number_of_done += int(numpy.sum(done))
+    number_of_moves += 256
+elapsed = time.perf_counter() - start
+assert number_of_done > 0
+print("{} games done, {:.0f} moves per second".format(number_of_done, number_of_moves / elapsed))
@@ -0,0 +1,54 @@
+import random
+
+from utils.seededenv import SeededHeartsEnv
+from strategy.completeplay import CompletePlayStrategy
+from strategy.belief import BeliefTracker
+from strategy.sampler import DealSampler
+from strategy.cards import ALL_CARDS_MASK
+from strategy.cards import CARD_TO_INDEX
+from strategy.cards import cards_to_mask
+
+
+# play seeded games, check that every real hand agrees with what the belief
+# tracker inferred and that constrained deals keep to the beliefs and counts
+number_of_games = 20
+number_of_deals = 0
+number_of_voids = 0
+sampler = DealSampler(0)
+for seed in range(number_of_games):
+    rng = random.Random(seed)
+    env = SeededHeartsEnv(seed=seed)
+    for _ in range(4):
+        env.add_player(CompletePlayStrategy())
+    env.start()
+    tracker = BeliefTracker()
+    played_mask = 0
+    done = False
+    while not done:
+        observation = env._current_observation
+        hands = [cards_to_mask(player.get_hand_cards()) for player in env._players]
+        for player_id, hand in enumerate(hands):
+            possible = tracker.possible(ALL_CARDS_MASK)[player_id]
+            assert hand & ~possible == 0
+        if rng.random() < 0.2:
+            player_id = observation['current_player_id']
+            hidden_mask = ALL_CARDS_MASK & ~played_mask & ~hands[player_id]
+            possible = tracker.possible(hidden_mask)
+            sampler.reset(hidden_mask, possible)
+            counts = observation['number_of_hand_cards_for_all_players']
+            dealt = sampler.deal(counts, player_id)
+            for i, hand in enumerate(dealt):
+                if i != player_id:
+                    assert bin(hand).count('1') == counts[i]
+                    assert hand & ~possible[i] == 0
+            number_of_deals += 1
+        action = env.move()
+        observation, reward, done, info = env.step(action)
+        tracker.watch(observation, info)
+        played_mask |= 1 << CARD_TO_INDEX[action]
+        if info['is_new_round']:
+            played_mask = 0
+        number_of_voids = max(number_of_voids, sum(len(tracker.voids(i)) for i in range(4)))
+print("{} games and {} constrained deals agree with the beliefs, up to {} voids known".format(
+    number_of_games, number_of_deals, number_of_voids
+))
@@ -0,0 +1,84 @@
+import random
+
+from utils.seededenv import SeededHeartsEnv
+from strategy.completeplay import CompletePlayStrategy
+from strategy.endgame import EndgameSolver
+from strategy.simulator import HeartsSimulator
+from strategy.cards import cards_to_mask
+
+
+# solve the last tricks of seeded games with EndgameSolver and check every
+# value against plain paranoid and max^n searches over the simulator
+def children(simulator):
+    # (card, points, looser) after every valid card of the simulator
+    for card in range(52):
+        if (simulator.valid_mask() >> card) & 1:
+            child = HeartsSimulator()
+            child.hands = list(simulator.hands)
+            child.trick = simulator.trick
+            child.current_player_id = simulator.current_player_id
+            child.playing_cards = list(simulator.playing_cards)
+            child.playing_ids = list(simulator.playing_ids)
+            child._trick_mask = simulator._trick_mask
+            child._lead_suit = simulator._lead_suit
+            result = child.step(card)
+            yield child, result
+
+
+def minimax(simulator, me):
+    if simulator.done():
+        return 0
+    values = []
+    for child, result in children(simulator):
+        points = result[0] if result is not None and result[1] == me else 0
+        values.append(points + minimax(child, me))
+    if simulator.current_player_id == me:
+        return min(values)
+    return max(values)
+
+
+def maxn(simulator, me):
+    if simulator.done():
+        return [0] * 4
+    player_id = simulator.current_player_id
+    best_values = None
+    best_order = None
+    for child, result in children(simulator):
+        values = maxn(child, me)
+        if result is not None:
+            values[result[1]] += result[0]
+        if player_id == me:
+            order = (values[me], -sum(values))
+        else:
+            order = (values[player_id], -values[me])
+        if best_order is None or order < best_order:
+            best_values = values
+            best_order = order
+    return best_values
+
+
+number_of_games = 6
+number_of_positions = 0
+paranoid_solver = EndgameSolver(paranoid=True)
+maxn_solver = EndgameSolver()
+for seed in range(number_of_games):
+    rng = random.Random(seed)
+    env = SeededHeartsEnv(seed=seed, sort_hands=True)
+    for _ in range(4):
+        env.add_player(CompletePlayStrategy())
+    env.start()
+    done = False
+    while not done:
+        observation = env._current_observation
+        if 1 < observation['trick'] and len(observation['hand_cards']) <= 3 and rng.random() < 0.5:
+            simulator = HeartsSimulator()
+            simulator.reset(observation, [cards_to_mask(player.get_hand_cards()) for player in env._players])
+            me = rng.randrange(4)
+            assert paranoid_solver.solve(simulator, me) == minimax(simulator, me)
+            assert maxn_solver.solve(simulator, me) == maxn(simulator, me)[me]
+            number_of_positions += 1
+        action = env.move()
+        observation, reward, done, info = env.step(action)
+print("{} endgame positions match, {:.0f} paranoid and {:.0f} max^n nodes per second".format(
+    number_of_positions, paranoid_solver.nodes_per_second(), maxn_solver.nodes_per_second()
+))
@@ -0,0 +1,58 @@
+import os
+import json
+import tempfile
+
+from utils.logger import profiler
+from utils.logger import ProfiledStrategy
+from utils.logger import instrument
+from utils.seededenv import SeededHeartsEnv
+from strategy.completeplay import CompletePlayStrategy
+from strategy.lookaheadplay import LookAheadPlayStrategy
+from strategy.mctsplay import MCTSPlayStrategy
+
+
+# a disabled profiler records nothing, an enabled one records every move of
+# the profiled players with the phases of their searches and one record per game,
+# work of the env and the unprofiled player between them is recorded as env
+def play(seed):
+    env = SeededHeartsEnv(seed=seed)
+    instrument(env._evaluator, 'evaluate', 'env.evaluate')
+    env.add_player(ProfiledStrategy(MCTSPlayStrategy(budget=50, my_player_id=0, seed=seed), 'mcts'))
+    env.add_player(ProfiledStrategy(LookAheadPlayStrategy(rollouts=4, seed=seed), 'lookahead'))
+    env.add_player(ProfiledStrategy(CompletePlayStrategy(cache_size=64), 'complete'))
+    env.add_player(CompletePlayStrategy())
+    env.start()
+    done = False
+    while not done:
+        observation, reward, done, info = env.step(env.move())
+
+
+play(0)
+assert profiler.records == []
+
+profiler.enable()
+for seed in range(2):
+    play(seed)
+profiler.disable()
+moves = [r for r in profiler.records if r['kind'] == 'move']
+games = [r for r in profiler.records if r['kind'] == 'game']
+assert sorted((r['player'], r['game']) for r in games) == [(p, g) for p in ('complete', 'lookahead', 'mcts') for g in (0, 1)]
+for game in games:
+    game_moves = [r for r in moves if r['player'] == game['player'] and r['game'] == game['game']]
+    assert abs(game['move.seconds'] - sum(r['move.seconds'] for r in game_moves)) < 1e-9
+mcts_moves = [r for r in moves if r['player'] == 'mcts']
+assert sum(r.get('mcts.iterations', 0) for r in mcts_moves) > 0
+assert all(r.get('mcts.depth.max', 0) <= 13 * 4 for r in mcts_moves)
+assert sum(r.get('endgame.solves', 0) for r in mcts_moves) > 0
+assert sum(r.get('lookahead.rollouts', 0) for r in moves if r['player'] == 'lookahead') > 0
+assert sum(r.get('complete.cache_misses', 0) for r in moves if r['player'] == 'complete') > 0
+assert all('env.evaluate.calls' not in r for r in moves)
+envs = [r for r in profiler.records if r['kind'] == 'env']
+assert sum(r.get('env.evaluate.calls', 0) for r in envs) > 0
+assert all('complete.cache_misses' not in r for r in moves if r['player'] != 'complete')
+
+path = os.path.join(tempfile.mkdtemp(), 'profile.jsonl')
+profiler.export(path)
+with open(path) as f:
+    assert [json.loads(line) for line in f] == profiler.records
+print(profiler.summary())
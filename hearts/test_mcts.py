@@ -0,0 +1,59 @@
+import numpy
+
+from utils import logger
+from utils.seededenv import SeededHeartsEnv
+from strategy.mcts import UCB1
+from strategy.mcts import UCB1Tuned
+from strategy.mcts import PUCT
+from strategy.mctsplay import MCTSPlayStrategy
+from strategy.completeplay import CompletePlayStrategy
+
+
+# Hearts nodes have at most 13 children, so searches never reach
+# VECTORIZE_MIN_CHILDREN. With it at 0 every selection takes the batch path:
+# for every policy scores() agrees with score() on every node of the search
+# trees, and the searches pick the same children and play the same game.
+def play(policy, vectorize_min_children, seed):
+    player = MCTSPlayStrategy(budget=200, my_player_id=0, seed=seed, policy=policy, endgame_cards=0)
+    player._mcts.VECTORIZE_MIN_CHILDREN = vectorize_min_children
+    env = SeededHeartsEnv(seed=seed)
+    env.add_player(player)
+    for _ in range(3):
+        env.add_player(CompletePlayStrategy())
+    env.start()
+    actions = []
+    checked = 0
+    done = False
+    while not done:
+        player_id = env._current_player_id
+        action = env.move()
+        actions.append(action)
+        if player_id == 0 and player._tree is not None:
+            checked += check_scores(policy, player._tree, player._mcts.SCALAR)
+        observation, reward, done, info = env.step(action)
+        if info['is_new_round']:
+            break
+    return actions, checked
+
+
+def check_scores(policy, tree, scalar):
+    checked = 0
+    for index in range(tree.size):
+        children = tree.children(index)
+        if len(children) < 2:
+            continue
+        batch = policy.scores(tree, numpy.array(children), scalar)
+        one_by_one = [policy.score(tree, child, scalar) for child in children]
+        assert numpy.allclose(batch, one_by_one, rtol=1e-12, atol=0.0)
+        assert int(numpy.argmax(batch)) == int(numpy.argmax(one_by_one))
+        checked += 1
+    return checked
+
+
+for policy in (UCB1, UCB1Tuned, PUCT):
+    for seed in range(2):
+        scalar_actions, _ = play(policy(), 32, seed)
+        batch_actions, checked = play(policy(), 0, seed)
+        assert checked > 0
+        assert batch_actions == scalar_actions
+    print("{}: batch and scalar selection agree".format(policy.__name__))
@@ -4,6 +4,7 @@ from gymhearts import env as hearts_env
 from treys import Card
 
 from utils import logger
+from utils.seededenv import SeededHeartsEnv
 from strategy.firstplay import FirstPlayStrategy
 from strategy.lowplay import LowPlayStrategy
 from strategy.completeplay import CompletePlayStrategy
@@ -11,8 +12,9 @@ from strategy.lookaheadplay import LookAheadPlayStrategy
 from strategy.mctsplay import MCTSPlayStrategy
 
 
+mcts_strategy = MCTSPlayStrategy(budget=10000, my_player_id=0, time_limit=0.05)
 env = hearts_env.HeartsEnv()
-env.add_player(MCTSPlayStrategy(budget=100, my_player_id=0))
+env.add_player(mcts_strategy)
 env.add_player(LookAheadPlayStrategy())
 env.add_player(LookAheadPlayStrategy())
 env.add_player(LookAheadPlayStrategy())
@@ -27,3 +29,17 @@ while not done:
     if (observation['trick'] == 0 and len(observation['playing_ids']) == 0) or (done is True):
        print("{}: {}".format(observation['round'], observation['scores']))
     # env.render()
+print("mcts iterations per second: {:.0f}".format(mcts_strategy.iterations_per_second()))
+
+# a strategy plays on into the next game, watch resets it when a game is done
+mcts_strategy = MCTSPlayStrategy(budget=50, my_player_id=0, seed=0)
+for seed in range(2):
+    env = SeededHeartsEnv(seed=seed)
+    env.add_player(mcts_strategy)
+    for _ in range(3):
+        env.add_player(CompletePlayStrategy())
+    env.start()
+    done = False
+    while not done:
+        observation, reward, done, info = env.step(env.move())
+    assert mcts_strategy._level == 0 and mcts_strategy._tree is None
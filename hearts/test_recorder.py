@@ -0,0 +1,101 @@
+import os
+import tempfile
+
+from utils import logger
+from utils.seededenv import SeededHeartsEnv
+from utils.recorder import GameRecorder
+from utils.recorder import RecordingStrategy
+from utils.recorder import read_rounds
+from utils.recorder import GAME_OVER
+from utils.recorder import PARTIAL
+from strategy.completeplay import CompletePlayStrategy
+from strategy.simulator import HeartsSimulator
+from strategy.cards import CARD_TO_INDEX
+from strategy.cards import cards_to_mask
+
+
+# record seeded games with a recording player, read the log back and check
+# the deals, plays and scores, and that replaying every round with the
+# simulator policy reproduces the recorded decisions.
+def play(seed, recorder, steps=None):
+    env = SeededHeartsEnv(seed=seed, sort_hands=True)
+    env.add_player(RecordingStrategy(CompletePlayStrategy(), recorder))
+    for _ in range(3):
+        env.add_player(CompletePlayStrategy())
+    env.start()
+    rounds = []
+    hands = [cards_to_mask(player.get_hand_cards()) for player in env._players]
+    plays = []
+    done = False
+    while not done and steps != 0:
+        action = env.move()
+        plays.append((env._current_player_id, CARD_TO_INDEX[action]))
+        observation, reward, done, info = env.step(action)
+        if info['is_new_round'] or done:
+            rounds.append((hands, plays, observation['scores']))
+            hands = [cards_to_mask(player.get_hand_cards()) for player in env._players]
+            plays = []
+        if steps is not None:
+            steps -= 1
+    return rounds, plays
+
+
+directory = tempfile.mkdtemp()
+for compress in (False, True):
+    path = os.path.join(directory, 'games.log' + ('.gz' if compress else ''))
+    expected = []
+    for seed in range(4):
+        recorder = GameRecorder(path, game=seed, compress=compress, buffer_size=256 * seed)
+        rounds, _ = play(seed, recorder)
+        recorder.close()
+        expected += [(seed, r, i == len(rounds) - 1) for i, r in enumerate(rounds)]
+    records = list(read_rounds(path))
+    assert len(records) == len(expected)
+    for record, (seed, (hands, plays, scores), last) in zip(records, expected):
+        assert record.game == seed
+        assert record.hands() == hands
+        assert record.plays == plays
+        assert record.scores == scores
+        assert record.flags == (GAME_OVER if last else 0)
+        simulator = HeartsSimulator()
+        simulator.reset({
+            'scores': [0] * 4, 'trick': 0, 'current_player_id': plays[0][0], 'playing_cards': [],
+            'playing_ids': [], 'valid_hand_cards': [],
+        }, hands)
+        for player_id, card in record.plays:
+            assert simulator.current_player_id == player_id
+            assert simulator.policy(simulator.valid_mask()) == card
+            simulator.step(card)
+    print("{} rounds of {} bytes recorded and replayed, compress={}".format(
+        len(records), os.path.getsize(path), compress))
+
+# a round that is cut short is kept as a partial record
+path = os.path.join(directory, 'partial.log')
+recorder = GameRecorder(path)
+rounds, plays = play(0, recorder, steps=60)
+recorder.close()
+records = list(read_rounds(path))
+assert [r.flags for r in records] == [0, PARTIAL]
+assert records[1].plays == plays and len(plays) == 8
+# and a record cut off in the middle of writing ends the log
+with open(path, 'r+b') as f:
+    f.truncate(os.path.getsize(path) - 3)
+assert len(list(read_rounds(path))) == 1
+
+# a compressed log cut off anywhere still reads the records before the cut
+path = os.path.join(directory, 'crash.log.gz')
+recorder = GameRecorder(path, compress=True, buffer_size=64)
+play(1, recorder, steps=300)
+recorder.close()
+complete = list(read_rounds(path))
+assert len(complete) > 2
+size = os.path.getsize(path)
+with open(path, 'rb') as f:
+    data = f.read()
+for cut in range(20, size, max(1, size // 40)):
+    with open(path, 'wb') as f:
+        f.write(data[:cut])
+    records = list(read_rounds(path))
+    assert records == complete[:len(records)]
+    if cut > size * 3 // 4:
+        assert len(records) > 2
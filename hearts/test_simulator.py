@@ -0,0 +1,63 @@
+import random
+
+from utils import logger
+from utils.seededenv import SeededHeartsEnv
+from strategy.completeplay import CompletePlayStrategy
+from strategy.simulator import HeartsSimulator
+from strategy.cards import CARD_TO_INDEX
+from strategy.cards import cards_to_mask
+
+
+# play seeded games in HeartsEnv with CompletePlayStrategy and check that the
+# simulator agrees on every valid card set, every action, every trick result
+# and on the round scores of rollouts started at random points of a round.
+def get_hands(env):
+    return [cards_to_mask(player.get_hand_cards()) for player in env._players]
+
+
+number_of_games = 20
+number_of_steps = 0
+number_of_rollouts = 0
+for seed in range(number_of_games):
+    rng = random.Random(seed)
+    env = SeededHeartsEnv(seed=seed, sort_hands=True)
+    # odd games check the strategy with its transposition cache on
+    players = [CompletePlayStrategy(cache_size=64 * (seed % 2)) for _ in range(4)]
+    for player in players:
+        env.add_player(player)
+    env.start()
+    observation = env.get_observation()
+    simulator = HeartsSimulator()
+    simulator.reset(observation, get_hands(env))
+    rollout_step = rng.randrange(52)
+    rollout = None
+    done = False
+    while not done:
+        valid_mask = simulator.valid_mask()
+        assert cards_to_mask(observation['valid_hand_cards']) == valid_mask
+        if number_of_steps % 52 == rollout_step:
+            rollout = HeartsSimulator()
+            rollout.reset(observation, get_hands(env))
+            rollout.rollout()
+            number_of_rollouts += 1
+        action = env.move()
+        assert CARD_TO_INDEX[action] == simulator.policy(valid_mask)
+        observation, reward, done, info = env.step(action)
+        result = simulator.step(CARD_TO_INDEX[action])
+        number_of_steps += 1
+        if 'punish_player_id' in info:
+            assert result == (info['punish_score'], info['punish_player_id'])
+        if info['is_new_round'] or done:
+            assert simulator.done()
+            assert simulator.scores == observation['scores']
+            if rollout is not None:
+                assert rollout.scores == observation['scores']
+            rollout = None
+            rollout_step = rng.randrange(52)
+            simulator.reset(observation, get_hands(env))
+        else:
+            assert simulator.current_player_id == observation['current_player_id']
+            assert simulator.scores == observation['scores']
+    if seed % 2:
+        assert sum(p.cache_hits for p in players) > 0
+print("{} games, {} steps and {} rollouts match HeartsEnv".format(number_of_games, number_of_steps, number_of_rollouts))
@@ -0,0 +1,157 @@
+import ast
+import sys
+import json
+import math
+import time
+import argparse
+import multiprocessing
+
+from utils.seededenv import SeededHeartsEnv
+from strategy.firstplay import FirstPlayStrategy
+from strategy.lowplay import LowPlayStrategy
+from strategy.completeplay import CompletePlayStrategy
+from strategy.lookaheadplay import LookAheadPlayStrategy
+from strategy.mctsplay import MCTSPlayStrategy
+
+
+# Play many seeded games of a lineup of four strategies over a process pool.
+# Every deal is played four times with the lineup rotated one seat further each
+# time, so every strategy plays every seat of every deal. One JSON line per game
+# is streamed to the output file as games finish.
+#
+#   python tournament.py mcts:budget=500 complete complete complete --games 1000 --workers 4
+#
+# A strategy is a name with optional keyword arguments, name:key=value,key=value.
+
+
+def _first(player_id, seed, **kwargs):
+    return FirstPlayStrategy()
+
+
+def _low(player_id, seed, **kwargs):
+    return LowPlayStrategy()
+
+
+def _complete(player_id, seed, **kwargs):
+    return CompletePlayStrategy(**kwargs)
+
+
+def _lookahead(player_id, seed, **kwargs):
+    return LookAheadPlayStrategy(seed=seed, **kwargs)
+
+
+def _mcts(player_id, seed, **kwargs):
+    kwargs.setdefault('budget', 1000)
+    return MCTSPlayStrategy(my_player_id=player_id, seed=seed, **kwargs)
+
+
+STRATEGIES = {
+    'first': _first,
+    'low': _low,
+    'complete': _complete,
+    'lookahead': _lookahead,
+    'mcts': _mcts,
+}
+
+
+def parse_strategy(spec):
+    name, _, arguments = spec.partition(':')
+    if name not in STRATEGIES:
+        raise ValueError("unknown strategy {}, choose from {}".format(name, ', '.join(sorted(STRATEGIES))))
+    kwargs = {}
+    for argument in filter(None, arguments.split(',')):
+        key, _, value = argument.partition('=')
+        kwargs[key] = ast.literal_eval(value)
+    return name, kwargs
+
+
+def play_game(lineup, seed, rotation):
+    # lineup[i] sits at seat (i + rotation) % 4
+    start = time.perf_counter()
+    env = SeededHeartsEnv(seed=seed)
+    seats = [lineup[(seat - rotation) % 4] for seat in range(4)]
+    players = []
+    for seat, spec in enumerate(seats):
+        name, kwargs = parse_strategy(spec)
+        player = STRATEGIES[name](seat, seed * 4 + seat, **kwargs)
+        players.append(player)
+        env.add_player(player)
+    env.start()
+    done = False
+    while not done:
+        action = env.move()
+        observation, reward, done, info = env.step(action)
+    for player in players:
+        if hasattr(player, 'close'):
+            player.close()
+    scores = observation['scores']
+    return {
+        'seed': seed,
+        'rotation': rotation,
+        'seats': seats,
+        'scores': scores,
+        # score of each lineup entry
+        'lineup_scores': [scores[(i + rotation) % 4] for i in range(4)],
+        'rounds': observation['round'],
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def _play_task(task):
+    return play_game(*task)
+
+
+def summarize(lineup, results, elapsed):
+    # mean final score of each lineup entry with a 95% confidence interval
+    lines = []
+    n = len(results)
+    for i, spec in enumerate(lineup):
+        scores = [r['lineup_scores'][i] for r in results]
+        mean = sum(scores) / n
+        variance = sum((s - mean) ** 2 for s in scores) / (n - 1) if n > 1 else 0.0
+        half_width = 1.96 * math.sqrt(variance / n)
+        lines.append("{} {:<40} {:8.2f} +- {:.2f}".format(i, spec, mean, half_width))
+    lines.append("{} games in {:.1f}s, {:.2f} games per second".format(n, elapsed, n / elapsed if elapsed else 0.0))
+    return '\n'.join(lines)
+
+
+def run(lineup, games, workers=0, seed=0, output=None):
+    for spec in lineup:
+        parse_strategy(spec)
+    tasks = [(lineup, seed + g // 4, g % 4) for g in range(games)]
+    start = time.perf_counter()
+    results = []
+    out = open(output, 'w') if output is not None else None
+    pool = multiprocessing.Pool(workers) if workers > 0 else None
+    try:
+        if pool is not None:
+            games_iter = pool.imap_unordered(_play_task, tasks)
+        else:
+            games_iter = map(_play_task, tasks)
+        for result in games_iter:
+            results.append(result)
+            if out is not None:
+                out.write(json.dumps(result) + '\n')
+                out.flush()
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if out is not None:
+            out.close()
+    return results, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='play a seeded hearts tournament')
+    parser.add_argument('lineup', nargs=4, help='four strategies, name or name:key=value,...')
+    parser.add_argument('--games', type=int, default=100, help='number of games, a multiple of 4 plays every seat evenly')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first deal')
+    parser.add_argument('--output', default='tournament.jsonl', help='JSON lines file, one game per line')
+    args = parser.parse_args()
+    try:
+        results, elapsed = run(args.lineup, args.games, args.workers, args.seed, args.output)
+    except ValueError as e:
+        sys.exit(str(e))
+    print(summarize(args.lineup, results, elapsed))
@@ -0,0 +1,210 @@
+import random
+
+import numpy
+
+from strategy.cards import CARD_TO_INDEX
+from strategy.batchplay import U64_SUIT_MASKS
+from strategy.batchplay import U64_SAFE_MASK
+from strategy.batchplay import U64_CLUB_TWO_BIT
+from strategy.batchplay import U64_ONE
+from strategy.batchplay import PENALTY_POINTS
+from strategy.batchplay import HIGH_RANK
+from strategy.batchplay import suit_ranks
+
+from gymhearts import env as hearts_env
+
+
+CLUB_TWO = CARD_TO_INDEX[hearts_env.HeartsEnv.CLUB_TWO]
+
+
+# Many hearts games stepped at once on numpy arrays, one card in every game
+# that is not done per step. Follows the rules of HeartsEnv like
+# HeartsSimulator does, a new leader follows the lead suit of the previous
+# trick, and ends a game when a player has endgame_score points at the end of
+# a round. Shooting the moon is not supported.
+#
+# Hands, valid cards and the cards of the current trick are uint64 bitmasks in
+# the cards.py encoding, cards are card indices. Strategies are called once
+# per step with the observation of all games where one of their seats is on
+# turn, see strategy.batchplay.
+#
+# Rounds are dealt from a numpy generator seeded with seed, or with seeds from
+# a random.Random per game that deals exactly like SeededHeartsEnv(seed).
+# With auto_reset a game that is done starts again in the same step, its
+# final scores are in info['final_scores'].
+class BatchHeartsEnv(object):
+
+    def __init__(self, number_of_games=None, seed=None, seeds=None, endgame_score=100, auto_reset=False):
+        if seeds is not None:
+            number_of_games = len(seeds)
+            self._randoms = [random.Random(s) for s in seeds]
+        else:
+            self._randoms = None
+        self._number_of_games = number_of_games
+        self._numpy_random = numpy.random.default_rng(seed)
+        self._endgame_score = endgame_score
+        self._auto_reset = auto_reset
+        self._strategies = []
+        n = number_of_games
+        self._games = numpy.arange(n)
+        self.hands = numpy.zeros((n, 4), numpy.uint64)
+        self.scores = numpy.zeros((n, 4), numpy.int64)
+        self.round = numpy.zeros(n, numpy.int64)
+        self.trick = numpy.zeros(n, numpy.int64)
+        self.current_player_id = numpy.zeros(n, numpy.int64)
+        self.done = numpy.zeros(n, bool)
+        self.playing_cards = numpy.full((n, 4), -1, numpy.int64)
+        self.number_of_playing_cards = numpy.zeros(n, numpy.int64)
+        self._playing_mask = numpy.zeros(n, numpy.uint64)
+        self._playing_points = numpy.zeros(n, numpy.int64)
+        # the suit a new leader is held to, see HeartsSimulator.valid_mask
+        self._lead_suit = numpy.zeros(n, numpy.int64)
+        self._valid = numpy.zeros(n, numpy.uint64)
+
+    def add_player(self, strategy):
+        self._strategies.append(strategy)
+
+    def start(self):
+        self.scores[:] = 0
+        self.round[:] = 0
+        self.done[:] = False
+        self._start_new_round(self._games)
+        self._update_valid()
+
+    def get_observation(self):
+        ob = {}
+        ob['trick'] = self.trick.copy()
+        ob['round'] = self.round.copy()
+        ob['scores'] = self.scores.copy()
+        ob['current_player_id'] = self.current_player_id.copy()
+        ob['hand_cards'] = self.hands[self._games, self.current_player_id]
+        ob['valid_hand_cards'] = self._valid.copy()
+        ob['playing_cards'] = self.playing_cards.copy()
+        ob['playing_mask'] = self._playing_mask.copy()
+        ob['number_of_playing_cards'] = self.number_of_playing_cards.copy()
+        ob['done'] = self.done.copy()
+        return ob
+
+    def move(self, observation=None):
+        # the card of every game, -1 where the game is done. Strategies that
+        # sit at several seats are called once for all of them.
+        if observation is None:
+            observation = self.get_observation()
+        actions = numpy.full(self._number_of_games, -1, numpy.int64)
+        seats_of = {}
+        for seat, strategy in enumerate(self._strategies):
+            seats_of.setdefault(id(strategy), (strategy, []))[1].append(seat)
+        for strategy, seats in seats_of.values():
+            games = ~self.done
+            if len(seats) < 4:
+                games &= numpy.isin(self.current_player_id, seats)
+            games = numpy.flatnonzero(games)
+            if len(games) == 0:
+                continue
+            if len(games) == self._number_of_games:
+                actions[:] = strategy.move(observation)
+            else:
+                actions[games] = strategy.move({k: v[games] for k, v in observation.items()})
+        return actions
+
+    def step(self, actions):
+        n = self._number_of_games
+        games = numpy.flatnonzero(~self.done)
+        cards = numpy.asarray(actions, numpy.int64)[games]
+        player_ids = self.current_player_id[games]
+        bits = U64_ONE << cards.astype(numpy.uint64)
+        if numpy.any((self._valid[games] & bits) == 0):
+            raise Exception("Error! action card not in the valid hand cards")
+        info = {}
+        info['current_player_id'] = self.current_player_id.copy()
+        info['action'] = numpy.where(self.done, -1, actions)
+        info['punish_score'] = numpy.zeros(n, numpy.int64)
+        info['punish_player_id'] = numpy.full(n, -1, numpy.int64)
+        info['is_new_round'] = numpy.zeros(n, bool)
+        info['final_scores'] = numpy.zeros((n, 4), numpy.int64)
+        rewards = numpy.zeros((n, 4), numpy.int64)
+        done = self.done.copy()
+
+        self.hands[games, player_ids] &= ~bits
+        positions = self.number_of_playing_cards[games]
+        self.playing_cards[games, positions] = cards
+        self._playing_mask[games] |= bits
+        self._playing_points[games] += PENALTY_POINTS[cards]
+        self.number_of_playing_cards[games] = positions + 1
+        self.current_player_id[games] = (player_ids + 1) % 4
+
+        finished = games[positions == 3]
+        if len(finished) > 0:
+            lead_suits = self.playing_cards[finished, 0] // 13
+            looser_cards = HIGH_RANK[suit_ranks(self._playing_mask[finished], lead_suits)] + 13 * lead_suits
+            looser_positions = numpy.argmax(self.playing_cards[finished] == looser_cards[:, None], axis=1)
+            # the player after the last one led the trick
+            looser_ids = (self.current_player_id[finished] + looser_positions) % 4
+            points = self._playing_points[finished]
+            self.scores[finished, looser_ids] += points
+            rewards[finished, looser_ids] = points
+            info['punish_score'][finished] = points
+            info['punish_player_id'][finished] = looser_ids
+            self.trick[finished] += 1
+            self._lead_suit[finished] = lead_suits
+            self.current_player_id[finished] = looser_ids
+            self._clear_trick(finished)
+
+            ended = finished[self.trick[finished] == 52 // 4]
+            if len(ended) > 0:
+                over = numpy.any(self.scores[ended] >= self._endgame_score, axis=1)
+                self.done[ended[over]] = True
+                done[ended[over]] = True
+                info['final_scores'][ended[over]] = self.scores[ended[over]]
+                new_round = ended[~over]
+                info['is_new_round'][new_round] = True
+                if self._auto_reset:
+                    self.scores[ended[over]] = 0
+                    self.round[ended[over]] = 0
+                    self.done[ended[over]] = False
+                    new_round = ended
+                self._start_new_round(new_round)
+        self._update_valid()
+        info['done'] = done
+        return self.get_observation(), rewards, done, info
+
+    def _clear_trick(self, games):
+        self.playing_cards[games] = -1
+        self.number_of_playing_cards[games] = 0
+        self._playing_mask[games] = 0
+        self._playing_points[games] = 0
+
+    def _start_new_round(self, games):
+        if len(games) == 0:
+            return
+        if self._randoms is not None:
+            deals = numpy.empty((len(games), 52), numpy.int64)
+            for i, game in enumerate(games):
+                # shuffles the card indices like SeededHeartsEnv shuffles the cards
+                cards = list(range(52))
+                self._randoms[game].shuffle(cards)
+                deals[i] = cards
+        else:
+            deals = numpy.argsort(self._numpy_random.random((len(games), 52)), axis=1)
+        bits = (U64_ONE << deals.astype(numpy.uint64)).reshape(len(games), 4, 13)
+        self.hands[games] = numpy.bitwise_or.reduce(bits, axis=2)
+        self.current_player_id[games] = numpy.argmax(deals == CLUB_TWO, axis=1) // 13
+        self.trick[games] = 0
+        self.round[games] += 1
+        self._lead_suit[games] = 0
+        self._clear_trick(games)
+
+    def _update_valid(self):
+        hands = self.hands[self._games, self.current_player_id]
+        lead_suits = numpy.where(self.number_of_playing_cards > 0, self.playing_cards[:, 0] // 13, self._lead_suit)
+        valid = hands & U64_SUIT_MASKS[lead_suits]
+        valid = numpy.where(valid == 0, hands, valid)
+        first_trick = self.trick == 0
+        if numpy.any(first_trick):
+            # no penalty cards in the first trick unless there is nothing else,
+            # and the first card is the two of clubs
+            safe = valid & U64_SAFE_MASK
+            valid = numpy.where(first_trick & (safe != 0), safe, valid)
+            valid = numpy.where(first_trick & (self.number_of_playing_cards == 0), U64_CLUB_TWO_BIT, valid)
+        valid[self.done] = 0
+        self._valid = valid
@@ -0,0 +1,61 @@
+import time
+import functools
+
+from gymhearts import strategy
+
+# the profiler lives with the strategies it profiles, it is exported here
+# with the helpers that profile players and objects
+from strategy.profiler import Profiler
+from strategy.profiler import profiler
+
+
+def instrument(obj, method, name):
+    # time every call of obj.method as name.seconds and name.calls while the
+    # profiler is enabled, e.g. instrument(env._evaluator, 'evaluate', 'env.evaluate')
+    function = getattr(obj, method)
+
+    @functools.wraps(function)
+    def timed(*args, **kwargs):
+        if not profiler.enabled:
+            return function(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profiler.add(name + '.seconds', time.perf_counter() - start)
+            profiler.add(name + '.calls')
+
+    setattr(obj, method, timed)
+    return obj
+
+
+# plays like strategy and closes a profiled move after every move() and a
+# profiled game when the game is done
+class ProfiledStrategy(strategy.IStrategy):
+
+    def __init__(self, strategy, name):
+        self._strategy = strategy
+        self._name = name
+
+    def move(self, observation, deadline=None):
+        if not profiler.enabled:
+            return self._move(observation, deadline)
+        profiler.begin_move()
+        start = time.perf_counter()
+        action = self._move(observation, deadline)
+        profiler.end_move(self._name, time.perf_counter() - start)
+        return action
+
+    def _move(self, observation, deadline):
+        if deadline is None:
+            return self._strategy.move(observation)
+        return self._strategy.move(observation, deadline)
+
+    def watch(self, observation, info):
+        if profiler.enabled and info['done']:
+            profiler.end_game(self._name)
+        self._strategy.watch(observation, info)
+
+    def close(self):
+        if hasattr(self._strategy, 'close'):
+            self._strategy.close()
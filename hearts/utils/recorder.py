@@ -0,0 +1,158 @@
+import os
+import gzip
+import zlib
+import struct
+import collections
+
+from gymhearts import strategy
+
+from strategy.cards import CARD_TO_INDEX
+
+
+# Append-only binary log of hearts games. The recorder watches every play, like
+# IStrategy.watch, and writes one record per round when the round ends. All 52
+# cards of a round are played, so the plays alone give the deal as well.
+#
+# The file starts with MAGIC, then records of a fixed width header
+#   flags (uint8), game (uint32), round (uint16), number of plays (uint8)
+# followed by one byte per play, player_id << 6 | card index in the cards.py
+# encoding, and the scores of the game after the round as four int16.
+# Records are buffered in memory and written every buffer_size bytes and on
+# close, a round that is not finished on close is written as PARTIAL. With
+# compress the file is a gzip stream, appending adds a gzip member to it.
+MAGIC = b'HRTS\x01'
+HEADER = struct.Struct('<BIHB')
+SCORES = struct.Struct('<4h')
+
+GAME_OVER = 1
+PARTIAL = 2
+
+
+class RoundRecord(collections.namedtuple('RoundRecord', 'flags game round plays scores')):
+
+    def hands(self):
+        # the hand of every player at the start of the round
+        hands = [0] * 4
+        for player_id, card in self.plays:
+            hands[player_id] |= 1 << card
+        return hands
+
+
+class GameRecorder(object):
+
+    def __init__(self, path, game=0, compress=False, buffer_size=1 << 16):
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = gzip.open(path, 'ab') if compress else open(path, 'ab')
+        self._game = game
+        self._buffer_size = buffer_size
+        self._buffer = bytearray(MAGIC if new else b'')
+        self._plays = bytearray()
+        self._round = 1
+        self._scores = [0] * 4
+
+    def new_game(self, game):
+        self._game = game
+        self._round = 1
+        self._plays = bytearray()
+
+    def watch(self, observation, info):
+        self._plays.append(info['current_player_id'] << 6 | CARD_TO_INDEX[info['action']])
+        self._scores = observation['scores']
+        if info['done']:
+            self._write(GAME_OVER)
+        elif info['is_new_round']:
+            self._write(0)
+            self._round += 1
+
+    def flush(self):
+        if self._buffer:
+            self._file.write(self._buffer)
+            self._file.flush()
+            self._buffer = bytearray()
+
+    def close(self):
+        if self._file is None:
+            return
+        if self._plays:
+            self._write(PARTIAL)
+        self.flush()
+        self._file.close()
+        self._file = None
+
+    def _write(self, flags):
+        self._buffer += HEADER.pack(flags, self._game, self._round, len(self._plays))
+        self._buffer += self._plays
+        self._buffer += SCORES.pack(*self._scores)
+        self._plays = bytearray()
+        if len(self._buffer) >= self._buffer_size:
+            self.flush()
+
+
+# plays like strategy and records every play it watches
+class RecordingStrategy(strategy.IStrategy):
+
+    def __init__(self, strategy, recorder):
+        self._strategy = strategy
+        self._recorder = recorder
+
+    def move(self, observation, deadline=None):
+        if deadline is None:
+            return self._strategy.move(observation)
+        return self._strategy.move(observation, deadline)
+
+    def watch(self, observation, info):
+        self._recorder.watch(observation, info)
+        self._strategy.watch(observation, info)
+
+
+def read_rounds(path):
+    # yield the RoundRecord of every round in the file, one at a time. A
+    # record cut off by a crash ends the log, in a plain file as well as in a
+    # gzip stream that ends in the middle of compressed data.
+    with open(path, 'rb') as f:
+        compressed = f.read(2) == b'\x1f\x8b'
+        f.seek(0)
+        chunks = _decompressed(f) if compressed else iter(lambda: f.read(1 << 16), b'')
+        data = bytearray()
+        magic = False
+        for chunk in chunks:
+            data += chunk
+            if not magic:
+                if len(data) < len(MAGIC):
+                    continue
+                if data[:len(MAGIC)] != MAGIC:
+                    break
+                del data[:len(MAGIC)]
+                magic = True
+            position = 0
+            while len(data) - position >= HEADER.size:
+                flags, game, round, number_of_plays = HEADER.unpack_from(data, position)
+                end = position + HEADER.size + number_of_plays + SCORES.size
+                if len(data) < end:
+                    break
+                plays = data[position + HEADER.size:end - SCORES.size]
+                scores = SCORES.unpack_from(data, end - SCORES.size)
+                yield RoundRecord(flags, game, round, [(b >> 6, b & 63) for b in plays], list(scores))
+                position = end
+            del data[:position]
+        if not magic and data != MAGIC[:len(data)]:
+            raise Exception("oops, {} is not a hearts game log".format(path))
+
+
+def _decompressed(f):
+    # the data of a gzip stream of one or more members, as far as it can be
+    # decompressed
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk in iter(lambda: f.read(1 << 16), b''):
+        while chunk:
+            try:
+                data = decompressor.decompress(chunk)
+            except zlib.error:
+                return
+            if data:
+                yield data
+            if not decompressor.eof:
+                break
+            # the next member starts in what is left of chunk
+            chunk = decompressor.unused_data
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
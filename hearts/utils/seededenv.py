@@ -0,0 +1,30 @@
+import random
+
+from gymhearts import env as hearts_env
+
+from strategy.cards import INDEX_TO_CARD
+from strategy.cards import CARD_TO_INDEX
+
+
+# HeartsEnv deals from an unseeded treys Deck, so games cannot be replayed.
+# This env deals every round from its own random.Random instead.
+class SeededHeartsEnv(hearts_env.HeartsEnv):
+
+    def __init__(self, seed=None, sort_hands=False, endgame_score=100):
+        super().__init__(endgame_score)
+        self._random = random.Random(seed)
+        self._sort_hands = sort_hands
+
+    def _start_new_round(self):
+        super()._start_new_round()
+        cards = INDEX_TO_CARD.copy()
+        self._random.shuffle(cards)
+        n = self._number_of_hand_card_per_player
+        for player_id, player in enumerate(self._players):
+            hand_cards = cards[player_id*n:(player_id+1)*n]
+            if self._sort_hands is True:
+                hand_cards.sort(key=CARD_TO_INDEX.get)
+            player.reset_hand_cards(hand_cards)
+            if hearts_env.HeartsEnv.CLUB_TWO in hand_cards:
+                self._current_player_id = player_id
+        self._current_observation = self.get_observation()
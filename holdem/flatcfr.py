@@ -0,0 +1,324 @@
+import numpy
+
+
+# CFR and CFR+ on a pycfr GameTree flattened into numpy arrays.
+#
+# Nodes are stored in breadth first order, so the nodes of one depth (a level)
+# are contiguous and so are the children of every node. Every node keeps the
+# edge it was reached by: the action slot of its parent's information set for
+# action nodes, the chance probability for chance nodes. Information sets are
+# ordered by level and player and own a contiguous range of action slots, so
+# regrets, strategies and strategy sums are flat arrays over all action slots.
+#
+# An iteration is one forward pass over the levels for the reach
+# probabilities, one backward pass for the node values and a few passes over
+# all action slots for regret matching and strategy averaging, instead of a
+# Python call per node.
+TERMINAL = 0
+CHANCE = 1
+ACTION = 2
+
+
+class FlatTree(object):
+
+    def __init__(self, players, node_type, player, parent, first_child, number_of_children, level_starts,
+                 edge_probability, edge_action, payoffs, infoset, infoset_offsets, infoset_player, infoset_level,
+                 action_ids, infoset_names):
+        self.players = players
+        self.node_type = node_type
+        self.player = player
+        self.parent = parent
+        self.first_child = first_child
+        self.number_of_children = number_of_children
+        self.level_starts = level_starts
+        self.edge_probability = edge_probability
+        self.edge_action = edge_action
+        self.payoffs = payoffs
+        self.infoset = infoset
+        self.infoset_offsets = infoset_offsets
+        self.infoset_player = infoset_player
+        self.infoset_level = infoset_level
+        self.action_ids = action_ids
+        self.infoset_names = infoset_names
+        # the file of a tree opened with treefile.open_tree
+        self.path = None
+        self._prepare()
+
+    def _prepare(self):
+        # index arrays the passes use every iteration
+        self.number_of_nodes = len(self.node_type)
+        self.number_of_actions = int(self.infoset_offsets[-1])
+        self.number_of_levels = len(self.level_starts) - 1
+        self.action_counts = numpy.diff(self.infoset_offsets)
+        self.action_infoset = numpy.repeat(numpy.arange(len(self.action_counts)), self.action_counts)
+        self.action_children = numpy.flatnonzero(self.edge_action >= 0)
+        # the reach column an edge multiplies: the acting player, or chance last
+        self.edge_mover = numpy.full(self.number_of_nodes, self.players, numpy.int64)
+        self.edge_mover[self.action_children] = self.player[self.parent[self.action_children]]
+        self.levels = []
+        for level in range(self.number_of_levels):
+            start, end = int(self.level_starts[level]), int(self.level_starts[level + 1])
+            internal = start + numpy.flatnonzero(self.number_of_children[start:end] > 0)
+            offsets = self.first_child[internal] - self.level_starts[level + 1]
+            self.levels.append((start, end, internal, offsets))
+        # the information sets of every (level, player) are a contiguous range
+        self.infoset_ranges = {}
+        for index, key in enumerate(zip(self.infoset_level.tolist(), self.infoset_player.tolist())):
+            first, _ = self.infoset_ranges.get(key, (index, index))
+            self.infoset_ranges[key] = (first, index + 1)
+
+    def edge_weights(self, strategy):
+        # the probability of every edge, 1 for the root
+        weights = self.edge_probability.copy()
+        weights[self.action_children] = strategy[self.edge_action[self.action_children]]
+        return weights
+
+    def reach(self, weights):
+        # reach probability of every node per player, chance in the last column
+        reach = numpy.ones((self.number_of_nodes, self.players + 1))
+        for start, end, internal, offsets in self.levels[1:]:
+            level_reach = reach[self.parent[start:end]]
+            rows = numpy.arange(end - start)
+            level_reach[rows, self.edge_mover[start:end]] *= weights[start:end]
+            reach[start:end] = level_reach
+        return reach
+
+    def values(self, weights):
+        # expected payoff of every node per player
+        values = self.payoffs.copy()
+        for level in range(self.number_of_levels - 2, -1, -1):
+            start, end, internal, offsets = self.levels[level]
+            if len(internal) == 0:
+                continue
+            child_start, child_end = self.level_starts[level + 1], self.level_starts[level + 2]
+            weighted = values[child_start:child_end] * weights[child_start:child_end, None]
+            values[internal] = numpy.add.reduceat(weighted, offsets, axis=0)
+        return values
+
+    def counterfactual_reach(self, reach, players):
+        # every row of reach without the column of its player, chance included
+        columns = numpy.arange(self.players + 1)
+        return numpy.where(columns[None, :] == players[:, None], 1.0, reach).prod(axis=1)
+
+    def regret_matching(self, regrets):
+        positive = numpy.maximum(regrets, 0.0)
+        return self.normalize(positive)
+
+    def normalize(self, weights):
+        # weights per information set scaled to probabilities, uniform where all are zero
+        if self.number_of_actions == 0:
+            return weights.copy()
+        totals = numpy.add.reduceat(weights, self.infoset_offsets[:-1])[self.action_infoset]
+        uniform = 1.0 / self.action_counts[self.action_infoset]
+        return numpy.where(totals > 0, weights / numpy.where(totals > 0, totals, 1.0), uniform)
+
+    def best_response(self, strategy):
+        # the best response of every player to strategy, as one chosen action
+        # slot per information set, and its expected value
+        weights = self.edge_weights(strategy)
+        reach = self.reach(weights)
+        chosen = numpy.zeros(self.number_of_actions, bool)
+        values = []
+        for player in range(self.players):
+            others = self.counterfactual_reach(reach, numpy.full(self.number_of_nodes, player))
+            own = self.action_children[self.player[self.parent[self.action_children]] == player]
+            best_weights = weights.copy()
+            best = self.payoffs[:, player].copy()
+            for level in range(self.number_of_levels - 2, -1, -1):
+                start, end, internal, offsets = self.levels[level]
+                if len(internal) == 0:
+                    continue
+                if (level, player) in self.infoset_ranges:
+                    edges = own[(own >= self.level_starts[level + 1]) & (own < self.level_starts[level + 2])]
+                    q = numpy.bincount(
+                        self.edge_action[edges], others[self.parent[edges]] * best[edges], self.number_of_actions
+                    )
+                    first, last = self.infoset_ranges[(level, player)]
+                    slots = self._argmax(q, first, last)
+                    chosen[slots] = True
+                    best_weights[edges] = chosen[self.edge_action[edges]]
+                child_start, child_end = self.level_starts[level + 1], self.level_starts[level + 2]
+                best[internal] = numpy.add.reduceat(
+                    best[child_start:child_end] * best_weights[child_start:child_end], offsets
+                )
+            values.append(float(best[0]))
+        return chosen, values
+
+    def _argmax(self, q, first, last):
+        # the first best action slot of every information set in [first, last)
+        lo, hi = self.infoset_offsets[first], self.infoset_offsets[last]
+        counts = self.action_counts[first:last]
+        q = q[lo:hi]
+        best = numpy.maximum.reduceat(q, self.infoset_offsets[first:last] - lo)
+        positions = numpy.flatnonzero(q >= numpy.repeat(best, counts))
+        _, firsts = numpy.unique(self.action_infoset[lo + positions], return_index=True)
+        return lo + positions[firsts]
+
+    def policies(self, strategy):
+        # {information set: [fold, call, raise]} of every player, like pycfr Strategy.policy
+        policies = [{} for _ in range(self.players)]
+        for infoset, name in enumerate(self.infoset_names):
+            probabilities = [0.0, 0.0, 0.0]
+            for slot in range(self.infoset_offsets[infoset], self.infoset_offsets[infoset + 1]):
+                probabilities[self.action_ids[slot]] = float(strategy[slot])
+            policies[self.infoset_player[infoset]][name] = probabilities
+        return policies
+
+
+def _actions(node):
+    # the children of an action node with their pycfr action
+    from pycfr.pokertrees import FOLD
+    from pycfr.pokertrees import CALL
+    from pycfr.pokertrees import RAISE
+    return [(action, child) for action, child in (
+        (FOLD, node.fold_action), (CALL, node.call_action), (RAISE, node.raise_action)
+    ) if child is not None]
+
+
+def flatten(gametree):
+    # FlatTree of a built pycfr GameTree, chance nodes deal uniformly. pycfr
+    # is only imported here, a FlatTree opened from a tree file runs without it
+    from pycfr.pokertrees import TerminalNode
+    from pycfr.pokertrees import ActionNode
+
+    players = gametree.rules.players
+    nodes = [gametree.root]
+    parents = [-1]
+    depths = [0]
+    edge_probabilities = [1.0]
+    edge_keys = [None]
+    first_children = []
+    infoset_keys = {}
+    i = 0
+    while i < len(nodes):
+        node = nodes[i]
+        if isinstance(node, TerminalNode):
+            children = []
+        elif isinstance(node, ActionNode):
+            key = (node.player, node.player_view)
+            actions = _actions(node)
+            known = infoset_keys.setdefault(key, (depths[i], [action for action, _ in actions]))
+            if known != (depths[i], [action for action, _ in actions]):
+                raise Exception("oops, information set {} has nodes that differ".format(key))
+            children = [child for _, child in actions]
+            edge_keys.extend((key, action) for action, _ in actions)
+            edge_probabilities.extend([1.0] * len(children))
+        else:
+            children = node.children
+            edge_keys.extend([None] * len(children))
+            edge_probabilities.extend([1.0 / len(children)] * len(children))
+        first_children.append(len(nodes) if children else -1)
+        nodes.extend(children)
+        parents.extend([i] * len(children))
+        depths.extend([depths[i] + 1] * len(children))
+        i += 1
+
+    # information sets ordered by level and player, then as first seen
+    order = sorted(infoset_keys, key=lambda k: (infoset_keys[k][0], k[0]))
+    infoset_index = {key: index for index, key in enumerate(order)}
+    infoset_offsets = numpy.zeros(len(order) + 1, numpy.int64)
+    action_ids = []
+    slots = {}
+    for index, key in enumerate(order):
+        for action in infoset_keys[key][1]:
+            slots[(key, action)] = len(action_ids)
+            action_ids.append(action)
+        infoset_offsets[index + 1] = len(action_ids)
+
+    n = len(nodes)
+    node_type = numpy.full(n, CHANCE, numpy.int8)
+    player = numpy.full(n, -1, numpy.int64)
+    infoset = numpy.full(n, -1, numpy.int64)
+    payoffs = numpy.zeros((n, players))
+    for index, node in enumerate(nodes):
+        if isinstance(node, TerminalNode):
+            node_type[index] = TERMINAL
+            payoffs[index] = node.payoffs
+        elif isinstance(node, ActionNode):
+            node_type[index] = ACTION
+            player[index] = node.player
+            infoset[index] = infoset_index[(node.player, node.player_view)]
+    first_child = numpy.array(first_children, numpy.int64)
+    parent = numpy.array(parents, numpy.int64)
+    number_of_children = numpy.bincount(parent[1:], minlength=n).astype(numpy.int64)
+    depth = numpy.array(depths, numpy.int64)
+    level_starts = numpy.searchsorted(depth, numpy.arange(depth[-1] + 2))
+    edge_action = numpy.array([-1 if k is None else slots[k] for k in edge_keys], numpy.int64)
+    return FlatTree(
+        players, node_type, player, parent, first_child, number_of_children, level_starts,
+        numpy.array(edge_probabilities), edge_action, payoffs, infoset, infoset_offsets,
+        numpy.array([key[0] for key in order], numpy.int64), numpy.array([infoset_keys[k][0] for k in order], numpy.int64),
+        numpy.array(action_ids, numpy.int8), [key[1] for key in order],
+    )
+
+
+class FlatCFR(object):
+
+    # plus=True runs CFR+: the players are updated in turn, regrets are
+    # floored at zero and iteration t adds to the average strategy with weight t
+    def __init__(self, tree, plus=False):
+        self.tree = tree
+        self.plus = plus
+        self.iterations = 0
+        self.regrets = numpy.zeros(tree.number_of_actions)
+        self.strategy_sums = numpy.zeros(tree.number_of_actions)
+        children = tree.action_children
+        movers = tree.player[tree.parent[children]]
+        if plus:
+            self._groups = [children[movers == player] for player in range(tree.players)]
+        else:
+            self._groups = [children]
+
+    def run(self, iterations):
+        for _ in range(iterations):
+            self.iterations += 1
+            weight = self.iterations if self.plus else 1
+            for children in self._groups:
+                self._update(children, weight)
+
+    def _update(self, children, weight):
+        # regrets and strategy sums of the action slots of children
+        tree = self.tree
+        parents = tree.parent[children]
+        slots = tree.edge_action[children]
+        movers = tree.player[parents]
+        strategy = tree.regret_matching(self.regrets)
+        weights = tree.edge_weights(strategy)
+        reach = tree.reach(weights)
+        values = tree.values(weights)
+        others = tree.counterfactual_reach(reach[parents], movers)
+        regrets = others * (values[children, movers] - values[parents, movers])
+        self.regrets += numpy.bincount(slots, regrets, tree.number_of_actions)
+        if self.plus:
+            numpy.maximum(self.regrets, 0.0, out=self.regrets)
+        # every child of an action node adds the reach of its parent once
+        own = reach[parents, movers] * strategy[slots]
+        self.strategy_sums += weight * numpy.bincount(slots, own, tree.number_of_actions)
+
+    def current_strategy(self):
+        return self.tree.regret_matching(self.regrets)
+
+    def average_strategy(self):
+        return self.tree.normalize(self.strategy_sums)
+
+    def expected_value(self, strategy=None):
+        if strategy is None:
+            strategy = self.average_strategy()
+        return self.tree.values(self.tree.edge_weights(strategy))[0].tolist()
+
+    def best_response(self, strategy=None):
+        # (best response policies, their expected values) of every player
+        # against the average strategy, like pycfr StrategyProfile.best_response
+        if strategy is None:
+            strategy = self.average_strategy()
+        chosen, values = self.tree.best_response(strategy)
+        return self.tree.policies(chosen.astype(numpy.float64)), values
+
+    def exploitability(self, strategy=None):
+        # for zero sum games, what best responses win against strategy
+        return sum(self.best_response(strategy)[1])
+
+    def policies(self, strategy=None):
+        if strategy is None:
+            strategy = self.average_strategy()
+        return self.tree.policies(strategy)
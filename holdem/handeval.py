@@ -0,0 +1,209 @@
+import itertools
+
+import numpy
+from treys import Card
+from treys.lookup import LookupTable
+
+
+# Batched hold'em hand evaluation with lookup tables, ranks are the ones of
+# treys: 1 is a royal flush, 7462 the worst high card.
+#
+# Cards are indices, index = suit_index * 13 + rank with suits in treys order
+# (s, h, d, c) as in the hearts package, or treys ints. A hand of n = 5 to 7
+# cards is ranked with sums of per card keys and table lookups:
+#   - the rank keys of the cards add up to a different sum for every rank
+#     count vector of n cards, the table of n maps the sum to the best non
+#     flush hand of the counts
+#   - the suit keys are octal digits, their sum tells if a suit has 5 cards or
+#     more, then FLUSH_RANK maps the 13-bit rank mask of that suit to its best
+#     flush or straight flush
+# With 7 cards or fewer a flush always beats what the other cards could make,
+# so the flush lookup wins whenever there is one. The table of n is built on
+# first use, the one of 7 cards takes 16 MB.
+#
+#   ranks = evaluate(holes, boards)       # (n, 2) and (n, 3..5) arrays
+#   equities = equity([hero, villain], board)
+LOOKUP = LookupTable()
+RANK_CLASSES = numpy.array([
+    LOOKUP.MAX_STRAIGHT_FLUSH, LOOKUP.MAX_FOUR_OF_A_KIND, LOOKUP.MAX_FULL_HOUSE, LOOKUP.MAX_FLUSH,
+    LOOKUP.MAX_STRAIGHT, LOOKUP.MAX_THREE_OF_A_KIND, LOOKUP.MAX_TWO_PAIR, LOOKUP.MAX_PAIR, LOOKUP.MAX_HIGH_CARD,
+])
+
+SUIT_INDEX = {1: 0, 2: 1, 4: 2, 8: 3}
+# index of the treys suit bits, -1 for values that are no suit
+_TREYS_SUIT = numpy.full(16, -1, numpy.int64)
+for _suit_int, _suit_index in SUIT_INDEX.items():
+    _TREYS_SUIT[_suit_int] = _suit_index
+
+RANK_KEYS = numpy.array([0, 1, 5, 22, 98, 453, 2031, 8698, 22854, 83661, 262349, 636345, 1479181], numpy.int64)
+CARD_RANK_KEY = RANK_KEYS[numpy.arange(52) % 13]
+CARD_SUIT_KEY = 8 ** (numpy.arange(52) // 13)
+PRIMES = numpy.array(Card.PRIMES, numpy.int64)
+
+
+def _flush_suits():
+    # the suit with 5 cards or more of every sum of suit keys, -1 for none
+    table = numpy.full(8 ** 4, -1, numpy.int8)
+    for key in range(8 ** 4):
+        for suit in range(4):
+            if key >> (3 * suit) & 7 >= 5:
+                table[key] = suit
+    return table
+
+
+def _flush_ranks():
+    table = numpy.zeros(1 << 13, numpy.int16)
+    bits = [[r for r in range(13) if mask >> r & 1] for mask in range(1 << 13)]
+    for size in (5, 6, 7):
+        for mask in range(1 << 13):
+            if len(bits[mask]) != size:
+                continue
+            if size == 5:
+                table[mask] = LOOKUP.flush_lookup[int(numpy.prod(PRIMES[bits[mask]]))]
+            else:
+                table[mask] = min(table[mask & ~(1 << r)] for r in bits[mask])
+    return table
+
+
+FLUSH_SUIT = _flush_suits()
+FLUSH_RANK = _flush_ranks()
+
+
+def _count_vectors(n):
+    # every rank count vector of n cards, at most 4 of a rank
+    vectors = []
+
+    def place(rank, left, counts):
+        if rank == 12:
+            if left <= 4:
+                vectors.append(counts + [left])
+            return
+        for count in range(min(left, 4) + 1):
+            place(rank + 1, left - count, counts + [count])
+
+    place(0, n, [])
+    return numpy.array(vectors, numpy.int64)
+
+
+def _best_counts(n):
+    # (prime products of the count vectors of n cards, their best non flush
+    # rank, the vectors), the best of more than 5 cards is the best without
+    # one of them
+    vectors = _count_vectors(n)
+    products = numpy.prod(PRIMES ** vectors, axis=1)
+    if n == 5:
+        return products, numpy.array([LOOKUP.unsuited_lookup[int(p)] for p in products], numpy.int64), vectors
+    smaller, smaller_best, _ = _best_counts(n - 1)
+    order = numpy.argsort(smaller)
+    best = numpy.full(len(vectors), LOOKUP.MAX_HIGH_CARD, numpy.int64)
+    for rank in range(13):
+        rows = vectors[:, rank] > 0
+        found = order[numpy.searchsorted(smaller, products[rows] // PRIMES[rank], sorter=order)]
+        best[rows] = numpy.minimum(best[rows], smaller_best[found])
+    return products, best, vectors
+
+
+_COUNT_RANK = {}
+
+
+def _count_rank(n):
+    if n not in _COUNT_RANK:
+        _, best, vectors = _best_counts(n)
+        sums = vectors @ RANK_KEYS
+        if len(numpy.unique(sums)) != len(sums):
+            raise Exception("oops, rank keys of {} cards collide".format(n))
+        table = numpy.zeros(sums.max() + 1, numpy.int16)
+        table[sums] = best
+        _COUNT_RANK[n] = table
+    return _COUNT_RANK[n]
+
+
+def to_indices(cards):
+    # card indices of an array of card indices or treys ints
+    cards = numpy.asarray(cards, numpy.int64)
+    if cards.size == 0 or cards.max() < 52:
+        return cards
+    suits = _TREYS_SUIT[(cards >> 12) & 0xF]
+    if (suits < 0).any():
+        raise ValueError("not a card index or a treys card")
+    return suits * 13 + ((cards >> 8) & 0xF)
+
+
+def evaluate_cards(cards):
+    # treys rank of every row of a (number of hands, 5..7) array of distinct cards
+    cards = to_indices(cards)
+    n = cards.shape[1]
+    if not 5 <= n <= 7:
+        raise ValueError("hands have 5 to 7 cards, not {}".format(n))
+    result = _count_rank(n).take(CARD_RANK_KEY.take(cards).sum(axis=1))
+    flush_suit = FLUSH_SUIT.take(CARD_SUIT_KEY.take(cards).sum(axis=1))
+    flushes = numpy.flatnonzero(flush_suit >= 0)
+    if len(flushes):
+        suited = cards[flushes]
+        masks = numpy.where(suited // 13 == flush_suit[flushes, None], 1 << suited % 13, 0).sum(axis=1)
+        result[flushes] = FLUSH_RANK[masks]
+    return result
+
+
+def evaluate(holes, boards):
+    # treys rank of hole cards and board cards, (number of hands, 2) and
+    # (number of hands, 3..5) arrays
+    return evaluate_cards(numpy.concatenate([to_indices(holes), to_indices(boards)], axis=1))
+
+
+def rank_class(ranks):
+    # treys rank class of ranks, 1 straight flush .. 9 high card
+    return numpy.searchsorted(RANK_CLASSES, ranks) + 1
+
+
+def _enumerated(deck, need, chunk_size):
+    if need == 0:
+        yield numpy.zeros((1, 0), numpy.int64)
+        return
+    combinations = itertools.combinations(deck.tolist(), need)
+    while True:
+        chunk = numpy.fromiter(
+            itertools.chain.from_iterable(itertools.islice(combinations, chunk_size)), numpy.int64
+        )
+        if len(chunk) == 0:
+            return
+        yield chunk.reshape(-1, need)
+
+
+def _sampled(deck, need, samples, chunk_size, rng):
+    while samples > 0:
+        size = min(samples, chunk_size)
+        picks = numpy.argpartition(rng.random((size, len(deck))), need - 1, axis=1)[:, :need]
+        yield deck[picks]
+        samples -= size
+
+
+def equity(holes, board=(), samples=None, opponents=0, seed=None, chunk_size=1 << 16):
+    # share of the pot every hand of holes wins on average against the others
+    # and opponents unknown hands, over every completion of board or over
+    # samples random ones
+    holes = [to_indices(hole) for hole in holes]
+    board = to_indices(board)
+    dead = numpy.concatenate(holes + [board])
+    if len(numpy.unique(dead)) != len(dead):
+        raise ValueError("cards are dealt twice")
+    deck = numpy.setdiff1d(numpy.arange(52), dead)
+    need = 5 - len(board)
+    if samples is None or need + 2 * opponents == 0:
+        if opponents:
+            raise ValueError("unknown hands of opponents need samples")
+        deals = _enumerated(deck, need, chunk_size)
+    else:
+        deals = _sampled(deck, need + 2 * opponents, samples, chunk_size, numpy.random.default_rng(seed))
+    wins = numpy.zeros(len(holes))
+    total = 0
+    for deal in deals:
+        size = len(deal)
+        boards = numpy.concatenate([numpy.broadcast_to(board, (size, len(board))), deal[:, :need]], axis=1)
+        hands = [numpy.broadcast_to(hole, (size, 2)) for hole in holes]
+        hands += [deal[:, need + 2 * i:need + 2 * i + 2] for i in range(opponents)]
+        ranks = numpy.stack([evaluate(hand, boards) for hand in hands], axis=1)
+        winners = ranks == ranks.min(axis=1, keepdims=True)
+        wins += (winners / winners.sum(axis=1, keepdims=True))[:, :len(holes)].sum(axis=0)
+        total += size
+    return wins / total
@@ -0,0 +1,25 @@
+import time
+
+import numpy
+from treys import Card
+
+from handeval import equity
+from handeval import evaluate
+from handeval import rank_class
+
+# a million random 7 card hands, cards as indices 0..51
+hands = numpy.argsort(numpy.random.default_rng(0).random((1000000, 52)), axis=1)[:, :7]
+evaluate(hands[:1, :2], hands[:1, 2:])
+start = time.perf_counter()
+ranks = evaluate(hands[:, :2], hands[:, 2:])
+print("{:.1f}M hands per second".format(len(hands) / (time.perf_counter() - start) / 1e6))
+print("rank classes: {}".format(numpy.bincount(rank_class(ranks), minlength=10)[1:]))
+
+# cards as treys ints
+aces = [Card.new('As'), Card.new('Ah')]
+kings = [Card.new('Kd'), Card.new('Kc')]
+print("AA vs KK, every board: {}".format(equity([aces, kings])))
+print("AA vs KK, 100000 boards: {}".format(equity([aces, kings], samples=100000, seed=0)))
+print("AA vs 3 random hands: {}".format(equity([aces], samples=100000, opponents=3, seed=0)))
+flop = [Card.new('Kh'), Card.new('7d'), Card.new('2c')]
+print("AA vs KK on Kh 7d 2c: {}".format(equity([aces, kings], flop)))
@@ -1,7 +1,12 @@
+import os
+
 from pycfr.pokertrees import *
 from pycfr.pokergames import *
 from pycfr.card import Card
 
+from flatcfr import flatten
+from treefile import cached_tree
+
 players = 2
 deck = [Card(14,1),Card(13,2),Card(13,1),Card(12,1)]
 rounds = [
@@ -11,5 +16,14 @@ rounds = [
 ante = 1
 blinds = [1,2]
 gamerules = GameRules(players, deck, rounds, ante, blinds, handeval=leduc_eval)
-gametree = GameTree(gamerules)
-gametree.build()
+
+# the tree is built and saved flat once per set of rules, later runs map the
+# file instead
+def build():
+    gametree = GameTree(gamerules)
+    gametree.build()
+    return flatten(gametree)
+
+path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'leduc.tree')
+tree = cached_tree(path, gamerules, build)
+print("{} nodes, {} information sets".format(tree.number_of_nodes, len(tree.infoset_names)))
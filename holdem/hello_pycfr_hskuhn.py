@@ -1,24 +1,29 @@
 from pycfr.pokertrees import *
 from pycfr.pokergames import *
 from pycfr.card import Card
-from pycfr.pokercfr import CounterfactualRegretMinimizer as CFR
+
+from flatcfr import FlatCFR
+from flatcfr import flatten
+from monitor import ExploitabilityMonitor
 
 hskuhn = half_street_kuhn_rules()
-cfr = CFR(hskuhn)
+gametree = GameTree(hskuhn)
+gametree.build()
+# the tree is flattened once, every iteration is a few numpy passes over it
+tree = flatten(gametree)
+cfr = FlatCFR(tree, plus=True)
 
-iters_per_block = 1000
-blocks = 10
-for block in xrange(blocks):
-    print("Iteration {}".format(block * iters_per_block))
-    cfr.run(iters_per_block)
-    result = cfr.profile.best_response()
-    print("Best response EV: {}".format(result[1]))
-    print("Total exploitability: {}".format(sum(result[1])))
+# exploitability is checked after 100, 250, 475, ... iterations and training
+# stops once it is below target
+monitor = ExploitabilityMonitor(
+    tree, every=100, growth=1.5, target=1e-4,
+    callback=lambda iterations, exploitability: print("Iteration {} exploitability: {}".format(iterations, exploitability)),
+)
+monitor.train(cfr, 10000)
+print("Best response EV: {}".format(cfr.best_response()[1]))
 
 # FOLD = 0
 # CALL = 1
 # RAISE = 2
-nash_strategies = cfr.profile
-for strategy in nash_strategies.strategies:
-    print(strategy.policy)
-
+for policy in cfr.policies():
+    print(policy)
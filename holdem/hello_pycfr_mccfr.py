@@ -0,0 +1,35 @@
+import os
+
+from pycfr.pokertrees import *
+from pycfr.pokergames import *
+from pycfr.card import Card
+
+from flatcfr import flatten
+from mccfr import MCCFR
+from monitor import ExploitabilityMonitor
+
+players = 2
+deck = [Card(14,1),Card(13,2),Card(13,1),Card(12,1)]
+rounds = [
+    RoundInfo(holecards=1,boardcards=0,betsize=2,maxbets=[2,2]),
+    RoundInfo(holecards=0,boardcards=1,betsize=4,maxbets=[2,2])]
+
+ante = 1
+blinds = [1,2]
+gamerules = GameRules(players, deck, rounds, ante, blinds, handeval=leduc_eval)
+gametree = GameTree(gamerules)
+gametree.build()
+
+# external sampling MCCFR with one worker process per cpu, all of them
+# updating the same regret tables in shared memory
+tree = flatten(gametree)
+mccfr = MCCFR(tree, sampling='external', workers=os.cpu_count(), seed=0)
+# exploitability of snapshots of the average strategy is computed in a
+# background process while the workers go on training
+monitor = ExploitabilityMonitor(
+    tree, every=10000, target=0.01, background=True,
+    callback=lambda iterations, exploitability: print("Iteration {} exploitability: {}".format(iterations, exploitability)),
+)
+monitor.train(mccfr, 100000)
+monitor.close()
+mccfr.close()
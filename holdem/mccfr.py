@@ -0,0 +1,241 @@
+import random
+import multiprocessing
+import concurrent.futures
+
+import numpy
+
+from flatcfr import TERMINAL
+from flatcfr import CHANCE
+from treefile import open_arrays
+
+
+# Monte Carlo CFR on a FlatTree: external sampling samples chance and the
+# other players and walks every action of the player it updates, outcome
+# sampling samples a single path per update with some exploration for the
+# player it updates. An iteration updates every player once.
+#
+# The tree arrays, regrets and strategy sums live in shared memory, so worker
+# processes of a pool all update the same tables without holding a copy of
+# the tree. Updates are not locked, a lost update now and then only adds a
+# little more noise to the sampled regrets. A tree opened from a tree file is
+# not copied at all, every process maps the file itself.
+
+_TREE_ARRAYS = (
+    'node_type', 'player', 'first_child', 'number_of_children', 'edge_probability', 'infoset', 'infoset_offsets',
+    'payoffs',
+)
+
+_worker_sampler = None
+
+
+def _share(array):
+    # a flat copy of array in shared memory
+    array = numpy.ascontiguousarray(array)
+    raw = multiprocessing.RawArray(array.dtype.char if array.dtype.char != 'l' else 'q', array.size)
+    numpy.frombuffer(raw, array.dtype)[:] = array.ravel()
+    return raw
+
+
+def _view(raw):
+    # a memoryview of a shared array, its items are Python numbers
+    return memoryview(raw).cast('B').cast(raw._type_._type_)
+
+
+def _views(shared):
+    views = {name: _view(raw) for name, raw in shared.items() if name != 'path'}
+    if 'path' in shared:
+        _, arrays = open_arrays(shared['path'])
+        views.update((name, memoryview(arrays[name].reshape(-1))) for name in _TREE_ARRAYS)
+    return views
+
+
+def _init_worker(players, shared, exploration):
+    global _worker_sampler
+    _worker_sampler = _Sampler(players, shared, exploration)
+
+
+def _run_in_worker(sampling, iterations, seed):
+    _worker_sampler.seed(seed)
+    _worker_sampler.run(sampling, iterations)
+    return iterations
+
+
+class _Sampler(object):
+
+    def __init__(self, players, shared, exploration, seed=None):
+        self._players = players
+        views = _views(shared)
+        self._node_type = views['node_type']
+        self._player = views['player']
+        self._first_child = views['first_child']
+        self._number_of_children = views['number_of_children']
+        self._edge_probability = views['edge_probability']
+        self._infoset = views['infoset']
+        self._infoset_offsets = views['infoset_offsets']
+        self._payoffs = views['payoffs']
+        self._regrets = views['regrets']
+        self._strategy_sums = views['strategy_sums']
+        self._exploration = exploration
+        self._random = random.Random(seed)
+
+    def seed(self, seed):
+        self._random.seed(seed)
+
+    def run(self, sampling, iterations):
+        for _ in range(iterations):
+            for player in range(self._players):
+                if sampling == 'external':
+                    self.external(0, player)
+                else:
+                    self.outcome(0, player, 1.0, 1.0, 1.0)
+
+    def _strategy(self, offset, count):
+        # regret matching
+        positive = [r if r > 0.0 else 0.0 for r in self._regrets[offset:offset + count]]
+        total = sum(positive)
+        if total > 0.0:
+            return [p / total for p in positive]
+        return [1.0 / count] * count
+
+    def _pick(self, probabilities):
+        r = self._random.random()
+        for action, p in enumerate(probabilities):
+            r -= p
+            if r < 0.0:
+                return action
+        return len(probabilities) - 1
+
+    def _chance(self, node):
+        first = self._first_child[node]
+        count = self._number_of_children[node]
+        return first + self._pick(self._edge_probability[first:first + count])
+
+    def external(self, node, traverser):
+        # the value of node for traverser
+        node_type = self._node_type[node]
+        if node_type == TERMINAL:
+            return self._payoffs[node * self._players + traverser]
+        if node_type == CHANCE:
+            return self.external(self._chance(node), traverser)
+        first = self._first_child[node]
+        count = self._number_of_children[node]
+        offset = self._infoset_offsets[self._infoset[node]]
+        strategy = self._strategy(offset, count)
+        if self._player[node] == traverser:
+            values = [self.external(first + action, traverser) for action in range(count)]
+            value = sum(p * v for p, v in zip(strategy, values))
+            regrets = self._regrets
+            for action in range(count):
+                regrets[offset + action] += values[action] - value
+            return value
+        strategy_sums = self._strategy_sums
+        for action in range(count):
+            strategy_sums[offset + action] += strategy[action]
+        return self.external(first + self._pick(strategy), traverser)
+
+    def outcome(self, node, traverser, own_reach, other_reach, sample_reach):
+        # (payoff of traverser over the probability to sample the path,
+        # reach of the terminal from node under the current strategy)
+        node_type = self._node_type[node]
+        if node_type == TERMINAL:
+            return self._payoffs[node * self._players + traverser] / sample_reach, 1.0
+        if node_type == CHANCE:
+            return self.outcome(self._chance(node), traverser, own_reach, other_reach, sample_reach)
+        first = self._first_child[node]
+        count = self._number_of_children[node]
+        offset = self._infoset_offsets[self._infoset[node]]
+        strategy = self._strategy(offset, count)
+        if self._player[node] != traverser:
+            action = self._pick(strategy)
+            value, tail = self.outcome(
+                first + action, traverser, own_reach, other_reach * strategy[action], sample_reach * strategy[action]
+            )
+            return value, tail * strategy[action]
+        exploration = self._exploration
+        probabilities = [exploration / count + (1.0 - exploration) * p for p in strategy]
+        action = self._pick(probabilities)
+        p = strategy[action]
+        value, tail = self.outcome(
+            first + action, traverser, own_reach * p, other_reach, sample_reach * probabilities[action]
+        )
+        weight = value * other_reach * tail
+        regrets = self._regrets
+        strategy_sums = self._strategy_sums
+        for other in range(count):
+            if other == action:
+                regrets[offset + other] += weight * (1.0 - p)
+            else:
+                regrets[offset + other] -= weight * p
+            strategy_sums[offset + other] += own_reach / sample_reach * strategy[other]
+        return value, tail * p
+
+
+class MCCFR(object):
+
+    # sampling is 'external' or 'outcome', exploration is the share of
+    # uniform random actions of the updated player in outcome sampling.
+    # With workers > 0 the iterations of run() are shared out to that many
+    # processes in tasks of at most batch_size iterations.
+    def __init__(self, tree, sampling='external', workers=0, seed=None, exploration=0.6, batch_size=1000):
+        if sampling not in ('external', 'outcome'):
+            raise ValueError("unknown sampling {}, choose external or outcome".format(sampling))
+        self.tree = tree
+        self.iterations = 0
+        self._sampling = sampling
+        self._batch_size = batch_size
+        self._random = random.Random(seed)
+        if tree.path is not None:
+            shared = {'path': tree.path}
+        else:
+            shared = {name: _share(getattr(tree, name)) for name in _TREE_ARRAYS}
+        shared['regrets'] = multiprocessing.RawArray('d', tree.number_of_actions)
+        shared['strategy_sums'] = multiprocessing.RawArray('d', tree.number_of_actions)
+        self.regrets = numpy.frombuffer(shared['regrets'], numpy.float64)
+        self.strategy_sums = numpy.frombuffer(shared['strategy_sums'], numpy.float64)
+        self._sampler = _Sampler(tree.players, shared, exploration, self._random.getrandbits(32))
+        self._executor = None
+        self._workers = workers
+        if workers > 0:
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker, initargs=(tree.players, shared, exploration),
+            )
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def run(self, iterations):
+        if self._executor is None:
+            self._sampler.run(self._sampling, iterations)
+        else:
+            batch_size = max(1, min(self._batch_size, iterations // self._workers))
+            futures = []
+            for start in range(0, iterations, batch_size):
+                futures.append(self._executor.submit(
+                    _run_in_worker, self._sampling, min(batch_size, iterations - start), self._random.getrandbits(32)
+                ))
+            for future in futures:
+                future.result()
+        self.iterations += iterations
+
+    def current_strategy(self):
+        return self.tree.regret_matching(self.regrets)
+
+    def average_strategy(self):
+        return self.tree.normalize(self.strategy_sums)
+
+    def best_response(self, strategy=None):
+        # (best response policies, their expected values) of every player
+        if strategy is None:
+            strategy = self.average_strategy()
+        chosen, values = self.tree.best_response(strategy)
+        return self.tree.policies(chosen.astype(numpy.float64)), values
+
+    def exploitability(self, strategy=None):
+        return sum(self.best_response(strategy)[1])
+
+    def policies(self, strategy=None):
+        if strategy is None:
+            strategy = self.average_strategy()
+        return self.tree.policies(strategy)
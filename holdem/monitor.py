@@ -0,0 +1,103 @@
+import time
+import concurrent.futures
+
+from treefile import open_tree
+
+
+# Tracks the exploitability of a solver's average strategy while it trains, on
+# the FlatTree the solver already has instead of a fresh best response walk of
+# the pycfr tree. Checks run every `every` iterations, the interval growing by
+# `growth` after each check, and training stops early once the
+# exploitability is at most target.
+#
+# With background=True the checks run in a separate process on a snapshot of
+# the average strategy while training goes on. A check that is due while the
+# previous one is still running is skipped, so training never waits for them
+# and the result of a check arrives one or more blocks after its snapshot. A
+# tree opened from a tree file is mapped by the process, not copied to it.
+_worker_tree = None
+
+
+def _init_worker(tree):
+    # tree is a FlatTree, or the path of the tree file to map
+    global _worker_tree
+    _worker_tree = open_tree(tree) if isinstance(tree, str) else tree
+
+
+def _exploitability(strategy, tree=None):
+    tree = tree if tree is not None else _worker_tree
+    return sum(tree.best_response(strategy)[1])
+
+
+class ExploitabilityMonitor(object):
+
+    def __init__(self, tree, every=1000, growth=1.0, target=None, background=False, callback=None):
+        self.tree = tree
+        self.every = every
+        self.growth = growth
+        self.target = target
+        self.callback = callback
+        # (iterations, exploitability, seconds in train() so far) of every check
+        self.history = []
+        self.best = None
+        self.best_strategy = None
+        # seconds spent in train() so far, over all calls
+        self.seconds = 0.0
+        self._executor = None
+        if background:
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=1, initializer=_init_worker,
+                initargs=(tree.path if tree.path is not None else tree,),
+            )
+        self._pending = None
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def train(self, solver, iterations):
+        # run solver for up to iterations more iterations, True when it
+        # reached target
+        end = solver.iterations + iterations
+        start = time.perf_counter() - self.seconds
+        every = self.every
+        try:
+            while solver.iterations < end:
+                solver.run(min(int(every), end - solver.iterations))
+                every *= self.growth
+                self.seconds = time.perf_counter() - start
+                if self._check(solver, self.seconds):
+                    return True
+            if self._pending is not None:
+                pending, self._pending = self._pending, None
+                return self._collect(pending.result())
+            return False
+        finally:
+            self.seconds = time.perf_counter() - start
+
+    def _check(self, solver, elapsed):
+        strategy = solver.average_strategy()
+        if self._executor is None:
+            return self._collect((solver.iterations, _exploitability(strategy, self.tree), elapsed, strategy))
+        reached = False
+        if self._pending is not None and self._pending.done():
+            pending, self._pending = self._pending, None
+            reached = self._collect(pending.result())
+        if self._pending is None and not reached:
+            self._pending = self._executor.submit(_snapshot, solver.iterations, strategy, elapsed)
+        return reached
+
+    def _collect(self, result):
+        iterations, exploitability, elapsed, strategy = result
+        self.history.append((iterations, exploitability, elapsed))
+        if self.best is None or exploitability < self.best[1]:
+            self.best = (iterations, exploitability)
+            self.best_strategy = strategy
+        if self.callback is not None:
+            self.callback(iterations, exploitability)
+        return self.target is not None and exploitability <= self.target
+
+
+def _snapshot(iterations, strategy, elapsed):
+    return iterations, _exploitability(strategy), elapsed, strategy
@@ -0,0 +1,118 @@
+import os
+import json
+import struct
+import hashlib
+
+import numpy
+
+from flatcfr import FlatTree
+
+
+# A FlatTree in a single file that is opened with mmap instead of rebuilt:
+#
+#   MAGIC, header length '<Q', JSON header, arrays
+#
+# The header holds the number of players, the information set names, an
+# optional fingerprint of the rules the tree was built for and the dtype,
+# shape and offset of every array. Arrays start at multiples of ALIGNMENT, so
+# open_tree() maps each of them read only in place. Processes that open the
+# same file share its pages through the page cache, only the index arrays
+# FlatTree derives on open are built in memory.
+#
+#   gametree.build()
+#   save_tree(flatten(gametree), 'leduc.tree')
+#   ...
+#   tree = open_tree('leduc.tree')
+#
+# cached_tree() only reuses a file that was saved for the same rules and
+# builds and saves the tree again when they changed.
+MAGIC = b'FLATTREE\x01'
+ALIGNMENT = 64
+
+_ARRAYS = (
+    'node_type', 'player', 'parent', 'first_child', 'number_of_children', 'level_starts', 'edge_probability',
+    'edge_action', 'payoffs', 'infoset', 'infoset_offsets', 'infoset_player', 'infoset_level', 'action_ids',
+)
+
+
+def _aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def fingerprint(value):
+    # digest of the numbers, strings and functions in value and in the
+    # attributes of the objects in it, e.g. of pycfr GameRules
+    return hashlib.sha256(_describe(value).encode('utf-8')).hexdigest()
+
+
+def _describe(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return repr(value)
+    if isinstance(value, (list, tuple)):
+        return '[' + ','.join(_describe(v) for v in value) + ']'
+    if isinstance(value, dict):
+        return '{' + ','.join(sorted(_describe(k) + ':' + _describe(v) for k, v in value.items())) + '}'
+    if hasattr(value, '__qualname__'):
+        return value.__module__ + '.' + value.__qualname__
+    if hasattr(value, '__dict__'):
+        return type(value).__name__ + _describe(vars(value))
+    return repr(value)
+
+
+def save_tree(tree, path, key=None):
+    arrays = [(name, numpy.ascontiguousarray(getattr(tree, name))) for name in _ARRAYS]
+    layout = []
+    size = 0
+    for name, array in arrays:
+        layout.append([name, array.dtype.str, list(array.shape), size])
+        size = _aligned(size + array.nbytes)
+    header = json.dumps({
+        'players': tree.players, 'infoset_names': list(tree.infoset_names), 'arrays': layout,
+        'fingerprint': key,
+    }).encode('utf-8')
+    start = _aligned(len(MAGIC) + 8 + len(header))
+    # written next to path and moved over it, processes that have the old
+    # file mapped keep their copy
+    with open(path + '.tmp', 'wb') as f:
+        f.write(MAGIC + struct.pack('<Q', len(header)) + header)
+        for (name, array), (_, _, _, offset) in zip(arrays, layout):
+            f.seek(start + offset)
+            f.write(array.tobytes())
+        f.truncate(start + size)
+    os.replace(path + '.tmp', path)
+
+
+def open_arrays(path):
+    # (header, read only memmap of every array)
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise Exception("oops, {} is not a tree file".format(path))
+        size, = struct.unpack('<Q', f.read(8))
+        header = json.loads(f.read(size).decode('utf-8'))
+    start = _aligned(len(MAGIC) + 8 + size)
+    data = numpy.memmap(path, numpy.uint8, 'r')
+    arrays = {}
+    for name, dtype, shape, offset in header['arrays']:
+        dtype = numpy.dtype(dtype)
+        end = start + offset + dtype.itemsize * int(numpy.prod(shape))
+        arrays[name] = data[start + offset:end].view(dtype).reshape(shape)
+    return header, arrays
+
+
+def open_tree(path):
+    header, arrays = open_arrays(path)
+    tree = FlatTree(header['players'], infoset_names=header['infoset_names'], **arrays)
+    tree.path = path
+    return tree
+
+
+def cached_tree(path, rules, build):
+    # the tree in path when it was saved for rules, else build() saved to
+    # path for rules
+    key = fingerprint(rules)
+    if os.path.exists(path):
+        header, _ = open_arrays(path)
+        if header.get('fingerprint') == key:
+            return open_tree(path)
+    save_tree(build(), path, key)
+    return open_tree(path)